@@ -0,0 +1,190 @@
+"""
+Benchmark the enrichment graph offline with a fake chat model.
+
+Measures runs/sec, per-node overhead (wall time minus model time), loop counts,
+memory per run and scaling across concurrency levels and schema sizes. Every number
+is reproducible without network access, e.g.:
+
+    python -m benchmarks.bench_graph --runs 200 --concurrency 1 8 32 --schema-sizes 3 100
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import statistics
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List
+
+from benchmarks.fake_model import register_fake_provider
+from enrichment import abatch_enrich
+from enrichment.batch import BatchStats
+from enrichment.instrumentation import InMemorySink, add_sink, remove_sink
+from enrichment.schema import compile_schema
+
+TOPIC = (
+    "OpenAI was founded by Sam Altman and others. Their website is https://openai.com. "
+    "They offer AI products such as ChatGPT, DALL-E, and Codex."
+)
+
+
+def make_schema(size: int) -> Dict[str, Any]:
+    """Build an extraction schema with `size` properties, alternating strings and arrays."""
+    properties: Dict[str, Any] = {}
+    for i in range(size):
+        if i % 2:
+            properties[f"field_{i}"] = {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": f"A list of items for field {i}.",
+            }
+        else:
+            properties[f"field_{i}"] = {"type": "string", "description": f"The value of field {i}."}
+    return {"type": "object", "properties": properties, "required": list(properties)}
+
+
+@dataclass
+class CaseResult:
+    """Measurements of one (schema size, concurrency) case."""
+
+    schema_size: int
+    concurrency: int
+    runs: int
+    failed: int
+    runs_per_sec: float
+    loops_per_run: float
+    memory_per_run_kib: float
+    node_overhead_ms: Dict[str, float]
+
+
+def _config(args: argparse.Namespace) -> Dict[str, Any]:
+    return {
+        "configurable": {
+            "model": "fake/bench",
+            "extraction_mode": args.mode,
+            "fast_path_validation": not args.no_fast_path,
+            "max_loops": args.max_loops,
+        },
+        "recursion_limit": 4 * args.max_loops + 10,
+    }
+
+
+async def _run_batch(schema: Dict[str, Any], runs: int, concurrency: int, config: Dict[str, Any]) -> BatchStats:
+    stats = BatchStats()
+    items = ((TOPIC, schema) for _ in range(runs))
+    async for _ in abatch_enrich(items, config, max_concurrency=concurrency, stats=stats):
+        pass
+    return stats
+
+
+async def _memory_per_run(schema: Dict[str, Any], config: Dict[str, Any], runs: int = 20) -> float:
+    """Median peak memory (KiB) allocated by one run above what was live before it."""
+    await _run_batch(schema, 1, 1, config)  # warm up caches before measuring
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(runs):
+            gc.collect()
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            await _run_batch(schema, 1, 1, config)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+    finally:
+        tracemalloc.stop()
+    return statistics.median(peaks) / 1024
+
+
+async def run_case(schema_size: int, concurrency: int, args: argparse.Namespace) -> CaseResult:
+    schema = make_schema(schema_size)
+    compile_schema(schema)
+    config = _config(args)
+    sink = add_sink(InMemorySink())
+    try:
+        await _run_batch(schema, min(args.runs, concurrency), concurrency, config)  # warm-up
+        sink.clear()
+        stats = await _run_batch(schema, args.runs, concurrency, config)
+        summary = sink.summary()
+    finally:
+        remove_sink(sink)
+    memory = await _memory_per_run(schema, config) if args.memory else 0.0
+    agent_calls = summary.get("call_agent_model", {}).get("count", 0)
+    return CaseResult(
+        schema_size=schema_size,
+        concurrency=concurrency,
+        runs=stats.completed,
+        failed=stats.failed,
+        runs_per_sec=stats.throughput,
+        loops_per_run=agent_calls / max(stats.completed, 1),
+        memory_per_run_kib=memory,
+        node_overhead_ms={node: row["overhead_p50"] * 1000 for node, row in summary.items()},
+    )
+
+
+def _print_table(results: List[CaseResult]) -> None:
+    nodes = sorted({node for r in results for node in r.node_overhead_ms})
+    header = ["schema", "conc", "runs", "fail", "runs/s", "loops", "KiB/run"] + [f"{n} p50 ms" for n in nodes]
+    print(" | ".join(header))
+    for r in results:
+        row = [
+            str(r.schema_size),
+            str(r.concurrency),
+            str(r.runs),
+            str(r.failed),
+            f"{r.runs_per_sec:.1f}",
+            f"{r.loops_per_run:.2f}",
+            f"{r.memory_per_run_kib:.1f}",
+        ] + [f"{r.node_overhead_ms.get(n, 0.0):.3f}" for n in nodes]
+        print(" | ".join(row))
+
+
+async def main(args: argparse.Namespace) -> List[CaseResult]:
+    register_fake_provider(
+        latency=args.latency,
+        output_tokens=args.output_tokens,
+        reflect_verdicts=[v == "y" for v in args.reflect_verdicts],
+    )
+    results = []
+    for schema_size in args.schema_sizes:
+        for concurrency in args.concurrency:
+            started = time.perf_counter()
+            results.append(await run_case(schema_size, concurrency, args))
+            if args.verbose:
+                print(f"schema={schema_size} concurrency={concurrency} took {time.perf_counter() - started:.2f}s")
+    return results
+
+
+def parse_args(argv: Any = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=100, help="runs per case")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--schema-sizes", type=int, nargs="+", default=[3, 50, 200])
+    parser.add_argument("--latency", type=float, default=0.0, help="fake model latency in seconds")
+    parser.add_argument("--output-tokens", type=int, default=200)
+    parser.add_argument(
+        "--reflect-verdicts",
+        nargs="+",
+        default=["y"],
+        choices=["y", "n"],
+        help="verdicts the fake reviewer cycles through",
+    )
+    parser.add_argument("--mode", choices=["text", "structured"], default="structured")
+    parser.add_argument("--no-fast-path", action="store_true", help="always run the LLM reviewer")
+    parser.add_argument("--max-loops", type=int, default=6)
+    parser.add_argument("--memory", action="store_true", help="also measure memory per run (slower)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    case_results = asyncio.run(main(arguments))
+    if arguments.json:
+        print(json.dumps([asdict(r) for r in case_results], indent=2))
+    else:
+        _print_table(case_results)
@@ -0,0 +1,59 @@
+"""
+Check offline that extraction climbs the model tiers one loop at a time.
+
+With a reviewer that rejects every answer, loop N must extract with tier N and the
+graph must stop after `max_loops` extractions:
+
+    python -m benchmarks.check_cascade
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+from typing import List
+
+from benchmarks.fake_model import register_fake_provider
+from enrichment import graph
+
+TIERS = ["fake/t0", "fake/t1", "fake/t2", "fake/t3"]
+MAX_LOOPS = 6
+
+
+async def extraction_models(extraction_mode: str) -> List[str]:
+    """Run the graph with an always-rejecting reviewer and return the model of every extraction call."""
+    calls: List[str] = []
+    register_fake_provider(reflect_verdicts=[False], call_log=calls)
+    await graph.ainvoke(
+        {
+            "topic": "OpenAI was founded by Sam Altman.",
+            "extraction_schema": {"type": "object", "properties": {"founder": {"type": "string"}}},
+        },
+        {
+            "configurable": {
+                "model": "fake/t4",
+                "model_tiers": TIERS,
+                "max_loops": MAX_LOOPS,
+                "fast_path_validation": False,
+                "extraction_mode": extraction_mode,
+            },
+            "recursion_limit": 4 * MAX_LOOPS + 10,
+        },
+    )
+    return calls
+
+
+def main() -> int:
+    expected = [name.split("/", 1)[1] for name in [*TIERS, "fake/t4"]]
+    expected += [expected[-1]] * (MAX_LOOPS - len(expected))
+    failed = False
+    for mode in ("text", "structured"):
+        used = asyncio.run(extraction_models(mode))
+        status = "ok" if used == expected else "FAILED"
+        failed = failed or used != expected
+        print(f"{mode}: {status} (used {used}, expected {expected})")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
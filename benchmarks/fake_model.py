@@ -0,0 +1,188 @@
+"""A deterministic local chat model for benchmarking the enrichment graph offline."""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+from enrichment.utils import get_message_text, register_model_provider
+
+FAKE_PROVIDER = "fake"
+
+
+def fake_value(schema: Dict[str, Any], name: str = "value") -> Any:
+    """Build a deterministic value that satisfies a JSON schema."""
+    if "enum" in schema:
+        return schema["enum"][0]
+    types = schema.get("type", "object")
+    kind = types[0] if isinstance(types, list) else types
+    if kind == "object":
+        return {key: fake_value(sub, key) for key, sub in (schema.get("properties") or {}).items()}
+    if kind == "array":
+        count = max(schema.get("minItems", 0), 2)
+        return [fake_value(schema.get("items") or {"type": "string"}, f"{name}_{i}") for i in range(count)]
+    if kind == "integer":
+        return max(schema.get("minimum", 0), 1)
+    if kind == "number":
+        return float(max(schema.get("minimum", 0), 1))
+    if kind == "boolean":
+        return True
+    if kind == "null":
+        return None
+    return f"{name} value"
+
+
+class FakeEnrichmentModel(BaseChatModel):
+    """
+    A chat model that answers instantly (plus a configurable latency) without network.
+
+    Extraction calls get a value generated from the bound schema tool, or the same value
+    as JSON text when no tool is bound. Reflection calls answer with the next verdict of
+    `reflect_verdicts`, cycling. Usage metadata reports `input_tokens` estimated from the
+    prompt (or the fixed value when set) and `output_tokens`. When `call_log` is a list,
+    the model appends its `model_name` to it on every extraction call.
+    """
+
+    latency: float = 0.0
+    input_tokens: Optional[int] = None
+    output_tokens: int = 200
+    reflect_verdicts: Sequence[bool] = (True,)
+    stream_chunk_size: int = 16
+    model_name: str = ""
+    # Typed as Any so pydantic keeps the caller's list instead of copying it.
+    call_log: Any = None
+    _verdicts: Iterator[bool] = PrivateAttr()
+    _last_schema: Dict[str, Any] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._verdicts = itertools.cycle(self.reflect_verdicts or (True,))
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-enrichment"
+
+    def bind_tools(self, tools: Sequence[Any], *, tool_choice: Optional[Any] = None, **kwargs: Any):  # type: ignore[override]
+        formatted = [convert_to_openai_tool(tool) for tool in tools]
+        return self.bind(tools=formatted, tool_choice=tool_choice, **kwargs)
+
+    def _answer(self, messages: List[BaseMessage], tools: Optional[List[Dict[str, Any]]]) -> AIMessage:
+        prompt_chars = sum(len(get_message_text(m)) for m in messages)
+        usage = {
+            "input_tokens": self.input_tokens if self.input_tokens is not None else prompt_chars // 4,
+            "output_tokens": self.output_tokens,
+            "total_tokens": 0,
+        }
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        if tools:
+            function = tools[0]["function"]
+            if function["name"] != "ReflectionResult" and self.call_log is not None:
+                self.call_log.append(self.model_name)
+            if function["name"] == "ReflectionResult":
+                verdict = next(self._verdicts)
+                args: Dict[str, Any] = {
+                    "is_satisfactory": verdict,
+                    "feedback": "Looks complete." if verdict else "Some fields are missing.",
+                }
+            else:
+                args = fake_value(function.get("parameters") or {})
+            return AIMessage(
+                content="",
+                tool_calls=[{"name": function["name"], "args": args, "id": f"call_{id(args)}"}],
+                usage_metadata=usage,
+            )
+        if self.call_log is not None:
+            self.call_log.append(self.model_name)
+        schema = self._schema_from_prompt(messages)
+        return AIMessage(content=json.dumps(fake_value(schema)), usage_metadata=usage)
+
+    def _schema_from_prompt(self, messages: List[BaseMessage]) -> Dict[str, Any]:
+        # Text mode prompts embed the indented schema; recover it to answer in JSON.
+        text = get_message_text(messages[0]) if messages else ""
+        start, end = text.find("{"), text.rfind("}")
+        decoder = json.JSONDecoder()
+        while 0 <= start < end:
+            try:
+                schema, _ = decoder.raw_decode(text[start:end + 1])
+                if isinstance(schema, dict) and "properties" in schema:
+                    return schema
+            except ValueError:
+                pass
+            start = text.find("{", start + 1)
+        return {"type": "object", "properties": {}}
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        message = self._answer(messages, kwargs.get("tools"))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        message = self._answer(messages, kwargs.get("tools"))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        message = self._answer(messages, kwargs.get("tools"))
+        if message.tool_calls:
+            tool_call = message.tool_calls[0]
+            text = json.dumps(tool_call["args"])
+        else:
+            text = message.content
+        pieces = [text[i:i + self.stream_chunk_size] for i in range(0, len(text), self.stream_chunk_size)] or [""]
+        delay = self.latency / len(pieces)
+        for index, piece in enumerate(pieces):
+            if delay:
+                await asyncio.sleep(delay)
+            first, last = index == 0, index == len(pieces) - 1
+            if message.tool_calls:
+                chunk = AIMessageChunk(
+                    content="",
+                    tool_call_chunks=[{
+                        "name": tool_call["name"] if first else None,
+                        "args": piece,
+                        "id": tool_call["id"] if first else None,
+                        "index": 0,
+                    }],
+                )
+            else:
+                chunk = AIMessageChunk(content=piece)
+            if last:
+                chunk.usage_metadata = message.usage_metadata
+            yield ChatGenerationChunk(message=chunk)
+
+
+def register_fake_provider(**settings: Any) -> None:
+    """Resolve `fake/<name>` model names to a `FakeEnrichmentModel` with `settings`."""
+    register_model_provider(
+        FAKE_PROVIDER,
+        lambda model, **kwargs: FakeEnrichmentModel(**{"model_name": model, **settings, **kwargs}),
+    )
@@ -1,5 +1,6 @@
 """Enrichment for a pre-defined schema."""
 
+from .batch import BatchResult, BatchStats, abatch_enrich
 from .graph import graph
 
-__all__ = ["graph"]
+__all__ = ["graph", "abatch_enrich", "BatchResult", "BatchStats"]
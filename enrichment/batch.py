@@ -0,0 +1,185 @@
+### Batch Enrichment
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field, replace
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from langchain_core.runnables import RunnableConfig
+
+from enrichment.graph import graph
+from enrichment.schema import compile_schema
+from enrichment.state import InputState, add_usage
+
+BatchItem = Union[InputState, Tuple[str, dict[str, Any]]]
+
+_DONE = object()
+
+
+@dataclass
+class BatchResult:
+    """Outcome of enriching a single item of a batch."""
+
+    index: int
+    topic: str
+    info: Optional[Any] = None
+    error: Optional[BaseException] = None
+    elapsed: float = 0.0
+    token_usage: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        """Whether the item was enriched without an error."""
+        return self.error is None
+
+
+@dataclass
+class BatchStats:
+    """Live counters for a batch run, updated as items complete."""
+
+    submitted: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: Optional[float] = None
+    token_usage: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def completed(self) -> int:
+        """Items finished so far, successfully or not."""
+        return self.succeeded + self.failed
+
+    @property
+    def in_flight(self) -> int:
+        """Items submitted but not finished yet."""
+        return self.submitted - self.completed
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the batch started, up to its end once it has finished."""
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return end - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """Completed items per second since the batch started."""
+        elapsed = self.elapsed
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+
+def _to_input_state(item: BatchItem) -> InputState:
+    if not isinstance(item, InputState):
+        topic, extraction_schema = item
+        item = InputState(topic=topic, extraction_schema=extraction_schema)
+    # Items with equal schemas share one compiled schema object, so the graph finds
+    # its pre-rendered prompt by identity instead of re-hashing the schema.
+    compiled_schema = compile_schema(item.extraction_schema)
+    return replace(item, extraction_schema=compiled_schema.schema)
+
+
+async def _aiter_items(
+    items: Union[Iterable[BatchItem], AsyncIterable[BatchItem]],
+) -> AsyncIterator[BatchItem]:
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def abatch_enrich(
+    items: Union[Iterable[BatchItem], AsyncIterable[BatchItem]],
+    config: Optional[RunnableConfig] = None,
+    *,
+    max_concurrency: int = 8,
+    stats: Optional[BatchStats] = None,
+) -> AsyncIterator[BatchResult]:
+    """
+    Run many items through the enrichment graph with bounded concurrency.
+
+    Items are either `InputState`s or `(topic, extraction_schema)` tuples and may come
+    from a plain or an async iterable; they are pulled lazily so the whole batch is never
+    materialized. Results are yielded in completion order, tagged with the index of the
+    item they belong to. A failing item yields a `BatchResult` carrying the exception
+    instead of aborting the batch. Pass a `BatchStats` to follow throughput while the
+    batch is running.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
+    stats = stats if stats is not None else BatchStats()
+    pending: asyncio.Queue = asyncio.Queue(maxsize=max_concurrency)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def stop_workers() -> None:
+        for _ in range(max_concurrency):
+            await pending.put(_DONE)
+
+    async def produce() -> None:
+        index = 0
+        try:
+            async for item in _aiter_items(items):
+                await pending.put((index, item))
+                stats.submitted += 1
+                index += 1
+        except Exception:
+            await stop_workers()
+            raise
+        await stop_workers()
+
+    async def work() -> None:
+        while True:
+            entry = await pending.get()
+            if entry is _DONE:
+                await results.put(_DONE)
+                return
+            index, item = entry
+            started = time.perf_counter()
+            topic = ""
+            try:
+                state = _to_input_state(item)
+                topic = state.topic
+                # The graph's input schema is InputState; its stubs only know the full State.
+                final_state = await graph.ainvoke(state, config)  # type: ignore[call-overload]
+                result = BatchResult(
+                    index=index,
+                    topic=topic,
+                    info=final_state.get("info"),
+                    token_usage=final_state.get("token_usage") or {},
+                )
+                stats.succeeded += 1
+                stats.token_usage = add_usage(stats.token_usage, result.token_usage)
+            except Exception as e:
+                result = BatchResult(index=index, topic=topic, error=e)
+                stats.failed += 1
+            result.elapsed = time.perf_counter() - started
+            await results.put(result)
+
+    producer = asyncio.create_task(produce())
+    workers = [asyncio.create_task(work()) for _ in range(max_concurrency)]
+    try:
+        remaining = len(workers)
+        while remaining:
+            result = await results.get()
+            if result is _DONE:
+                remaining -= 1
+                continue
+            yield result
+        # Surface errors raised by the input iterator itself.
+        await producer
+    finally:
+        stats.finished_at = time.perf_counter()
+        for task in [producer, *workers]:
+            task.cancel()
+        await asyncio.gather(producer, *workers, return_exceptions=True)
@@ -0,0 +1,257 @@
+### Response Cache
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from langchain_core.messages import BaseMessage, message_to_dict
+
+from enrichment.configuration import Configuration
+from enrichment.instrumentation import record_model_call
+
+T = TypeVar("T")
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters of a response cache."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ResponseCache(ABC):
+    """A key/value store for JSON-serializable model responses."""
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: int = 10_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for `key`, or None on a miss."""
+
+    @abstractmethod
+    def set(self, key: str, value: Any) -> None:
+        """Store `value` under `key`, evicting the oldest entries when full."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove every entry."""
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl is not None and now - created_at > self.ttl
+
+
+class InMemoryResponseCache(ResponseCache):
+    """An LRU cache held in process memory."""
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: int = 10_000):
+        super().__init__(ttl=ttl, max_entries=max_entries)
+        self._entries: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0], time.time()):
+                del self._entries[key]
+                self.stats.evictions += 1
+                entry = None
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteResponseCache(ResponseCache):
+    """A persistent LRU cache stored in a SQLite database file."""
+
+    def __init__(self, path: str, ttl: Optional[float] = None, max_entries: int = 10_000):
+        super().__init__(ttl=ttl, max_entries=max_entries)
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+        )
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self._expired(row[1], now):
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.stats.evictions += 1
+                row = None
+            if row is None:
+                self.stats.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.stats.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                overflow = count - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self.stats.evictions += overflow
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+
+_caches: Dict[Tuple[Any, ...], ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(configuration: Configuration) -> Optional[ResponseCache]:
+    """
+    Return the process-wide response cache selected by the configuration.
+    Returns None when caching is disabled.
+    """
+    backend = configuration.response_cache
+    if backend == "none":
+        return None
+    key = (
+        backend,
+        configuration.response_cache_path if backend == "sqlite" else None,
+        configuration.response_cache_ttl,
+        configuration.response_cache_max_entries,
+    )
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            if backend == "memory":
+                cache = InMemoryResponseCache(
+                    ttl=configuration.response_cache_ttl,
+                    max_entries=configuration.response_cache_max_entries,
+                )
+            elif backend == "sqlite":
+                cache = SQLiteResponseCache(
+                    configuration.response_cache_path,
+                    ttl=configuration.response_cache_ttl,
+                    max_entries=configuration.response_cache_max_entries,
+                )
+            else:
+                raise ValueError(f"Unknown response cache backend: {backend!r}")
+            _caches[key] = cache
+        return cache
+
+
+def response_cache_stats() -> Dict[str, CacheStats]:
+    """Return the counters of every response cache created in this process."""
+    with _caches_lock:
+        return {
+            ":".join(str(part) for part in key if part is not None): cache.stats
+            for key, cache in _caches.items()
+        }
+
+
+def make_cache_key(
+    model_name: str,
+    prompt: str,
+    messages: Sequence[BaseMessage] = (),
+    options: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Hash the model name, the rendered prompt and the message history into a cache key.
+    `options` holds anything else that changes the response, such as bound tools.
+    """
+    history: List[Dict[str, Any]] = []
+    for message in messages:
+        data = message_to_dict(message)
+        # Message ids are assigned per run and would defeat content addressing.
+        data["data"].pop("id", None)
+        history.append(data)
+    payload = json.dumps(
+        {"model": model_name, "prompt": prompt, "messages": history, "options": options or {}},
+        sort_keys=True,
+        default=repr,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def acached_call(
+    cache: Optional[ResponseCache],
+    key: str,
+    call: Callable[[], Awaitable[T]],
+    *,
+    dump: Callable[[T], Any],
+    load: Callable[[Any], T],
+    message: Optional[Callable[[T], Any]] = None,
+) -> T:
+    """
+    Await `call()` unless `cache` already holds a response for `key`.
+    `dump` and `load` convert the response to and from its JSON-serializable form.
+    `message` picks the model message out of a response that wraps it, so that its
+    token usage is recorded; by default the response is the message.
+    """
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            record_model_call(0.0, cache_hit=True)
+            return load(cached)
+    started = time.perf_counter()
+    result = await call()
+    record_model_call(
+        time.perf_counter() - started,
+        message(result) if message is not None else result,
+        cache_hit=False if cache is not None else None,
+    )
+    if cache is not None:
+        cache.set(key, dump(result))
+    return result
@@ -3,7 +3,7 @@
 
 from __future__ import annotations
 from dataclasses import dataclass, field, fields
-from typing import Annotated, Optional
+from typing import Annotated, Any, Literal, Optional
 
 from langchain_core.runnables import RunnableConfig, ensure_config
 from enrichment import prompts  # See prompts section below
@@ -15,13 +15,103 @@ class Configuration:
     model: Annotated[str, {"__template_metadata__": {"kind": "llm"}}] = field(
         default="openai/gpt-4o",
         metadata={
-            "description": "The name of the language model to use. Should be in the form: provider/model-name."
+            "description": "The name of the language model to use. Should be in the form: provider/model-name. With model_tiers set, this is the last and strongest tier."
+        },
+    )
+    model_tiers: list[str] = field(
+        default_factory=list,
+        metadata={
+            "description": "Faster or cheaper models tried before `model`, in order. Extraction starts on the first tier and moves one tier up on every further loop, ending on `model`."
+        },
+    )
+    reflection_model: Optional[str] = field(
+        default=None,
+        metadata={
+            "description": "The model that reviews answers in the reflect step. Defaults to `model`."
         },
     )
     prompt: str = field(
         default=prompts.MAIN_PROMPT,
         metadata={
-            "description": "The main prompt template. Expects two arguments: {info} and {topic}."
+            "description": "The main prompt template. Expects two arguments: {info} and {topic}. Keep {topic} last so the schema part forms a stable, cacheable prefix."
+        },
+    )
+    extraction_mode: Literal["text", "structured"] = field(
+        default="text",
+        metadata={
+            "description": "'text' stores the model's free-text answer in info. 'structured' binds the extraction schema as a tool, validates the arguments against it and stores them as a dict."
+        },
+    )
+    stream_partial_info: bool = field(
+        default=False,
+        metadata={
+            "description": "Stream the model's answer and emit partially parsed fields on the graph's 'custom' stream mode."
+        },
+    )
+    fast_path_validation: bool = field(
+        default=True,
+        metadata={
+            "description": "Check answers against the extraction schema locally and finish without the LLM reviewer when they pass."
+        },
+    )
+    context_strategy: Literal["full", "window", "latest", "summarize"] = field(
+        default="full",
+        metadata={
+            "description": "How prior loops are sent back to the model: 'full' history, a token 'window', only the 'latest' answer and its feedback, or a window plus a 'summarize'd digest of older turns."
+        },
+    )
+    max_context_tokens: Optional[int] = field(
+        default=4000,
+        metadata={
+            "description": "Approximate token budget for prior messages under the 'window' and 'summarize' strategies."
+        },
+    )
+    prompt_caching: bool = field(
+        default=False,
+        metadata={
+            "description": "Mark the part of the prompt before {topic} as cacheable (Anthropic cache_control). Cached and uncached input tokens are reported in token_usage either way."
+        },
+    )
+    chunk_size: Optional[int] = field(
+        default=None,
+        metadata={
+            "description": "Topics longer than this many characters are split into chunks and extracted map-reduce style. None disables splitting; explicit `chunks` in the input are always used."
+        },
+    )
+    map_concurrency: int = field(
+        default=8,
+        metadata={
+            "description": "The maximum number of chunk extractions running at once in map-reduce mode."
+        },
+    )
+    vector_store: Optional[Any] = field(
+        default=None,
+        metadata={
+            "description": "A VectorBackend (CustomSupabaseVectorStore, LocalVectorStore or a compatible store) used for retrieval-scoped extraction."
+        },
+    )
+    retrieval_k: Optional[int] = field(
+        default=None,
+        metadata={
+            "description": "When set together with a vector store and input knowledge_ids, only the top-k chunks per schema property are retrieved and sent as the topic."
+        },
+    )
+    retrieval_score_threshold: Optional[float] = field(
+        default=None,
+        metadata={
+            "description": "The minimum similarity for a retrieved chunk to be kept."
+        },
+    )
+    retrieval_mode: Literal["vector", "hybrid"] = field(
+        default="vector",
+        metadata={
+            "description": "'vector' retrieves by embedding similarity only. 'hybrid' fuses full-text and vector candidates with reciprocal rank fusion, which also finds exact identifiers such as names and URLs; needs a store with `hybrid_search`."
+        },
+    )
+    retrieval_rerank: bool = field(
+        default=False,
+        metadata={
+            "description": "In hybrid mode, rerank the fused candidates with a local BM25 scorer within a small latency budget."
         },
     )
     max_loops: int = field(
@@ -30,6 +120,40 @@ class Configuration:
             "description": "The maximum number of interaction loops before termination."
         },
     )
+    response_cache: Literal["none", "memory", "sqlite"] = field(
+        default="none",
+        metadata={
+            "description": "Where to cache model responses keyed by model, prompt and history: 'none', 'memory' or 'sqlite'."
+        },
+    )
+    response_cache_path: str = field(
+        default=".enrichment_cache.sqlite",
+        metadata={
+            "description": "The database file used by the 'sqlite' response cache."
+        },
+    )
+    response_cache_ttl: Optional[float] = field(
+        default=None,
+        metadata={
+            "description": "Seconds after which a cached response expires. None keeps entries until evicted."
+        },
+    )
+    response_cache_max_entries: int = field(
+        default=10_000,
+        metadata={
+            "description": "The maximum number of cached responses before the least recently used are evicted."
+        },
+    )
+
+    def extraction_model(self, loop_step: int = 0) -> str:
+        """Return the model that extracts on the given loop, climbing the tiers as loops are rejected."""
+        cascade = [*self.model_tiers, self.model]
+        return cascade[min(loop_step, len(cascade) - 1)]
+
+    @property
+    def review_model(self) -> str:
+        """Return the model used by the reflect step."""
+        return self.reflection_model or self.model
 
     @classmethod
     def from_runnable_config(cls, config: Optional[RunnableConfig] = None) -> Configuration:
@@ -0,0 +1,135 @@
+### Context Management
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, RemoveMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+
+from enrichment.cache import acached_call, get_response_cache, make_cache_key
+from enrichment.configuration import Configuration
+from enrichment.utils import get_message_text, get_token_usage, init_model
+
+SUMMARY_PROMPT = """Summarize the earlier attempts at this extraction task below. Keep every extracted value that is still relevant and every piece of reviewer feedback, and drop anything that has been superseded.
+
+{previous_summary}{transcript}"""
+
+
+@dataclass
+class CompactedHistory:
+    """The history to send to the model and the updates that keep the channel in sync."""
+
+    messages: List[BaseMessage]
+    removals: List[RemoveMessage]
+    summary: Optional[str] = None
+    # Tokens spent on summarizing, to be added to the run's token_usage.
+    token_usage: Dict[str, int] = field(default_factory=dict)
+
+
+def estimate_tokens(message: BaseMessage) -> int:
+    """Roughly estimate the number of tokens of a message (about four characters each)."""
+    chars = len(get_message_text(message))
+    if isinstance(message, AIMessage):
+        chars += sum(len(json.dumps(tool_call["args"])) for tool_call in message.tool_calls)
+    return chars // 4 + 4
+
+
+def _drop_orphans(messages: List[BaseMessage]) -> List[BaseMessage]:
+    # A tool result is only valid right after the AI message that requested it.
+    start = 0
+    while start < len(messages) and isinstance(messages[start], ToolMessage):
+        start += 1
+    return messages[start:]
+
+
+def window(messages: Sequence[BaseMessage], max_tokens: Optional[int]) -> List[BaseMessage]:
+    """Keep the newest messages that fit in `max_tokens`."""
+    if max_tokens is None:
+        return list(messages)
+    kept: List[BaseMessage] = []
+    budget = max_tokens
+    for message in reversed(messages):
+        budget -= estimate_tokens(message)
+        if budget < 0:
+            break
+        kept.append(message)
+    return _drop_orphans(kept[::-1])
+
+
+def latest(messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+    """Keep the latest answer, its tool results and the feedback that followed it."""
+    for index in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[index], AIMessage):
+            return list(messages[index:])
+    return list(messages)
+
+
+def message_transcript(message: BaseMessage) -> str:
+    """The text of a message followed by the arguments of its tool calls, where structured answers live."""
+    parts = [get_message_text(message)]
+    if isinstance(message, AIMessage):
+        parts.extend(json.dumps(tool_call["args"]) for tool_call in message.tool_calls)
+    return "\n".join(part for part in parts if part)
+
+
+async def asummarize(
+    messages: Sequence[BaseMessage],
+    previous_summary: Optional[str],
+    config: Optional[RunnableConfig] = None,
+) -> Tuple[str, Dict[str, int]]:
+    """Fold `messages` into the running summary of earlier loops; also returns the tokens spent."""
+    transcript = "\n\n".join(f"{m.type}: {message_transcript(m)}" for m in messages)
+    prompt_text = SUMMARY_PROMPT.format(
+        previous_summary=f"Summary so far:\n{previous_summary}\n\n" if previous_summary else "",
+        transcript=transcript,
+    )
+    configuration = Configuration.from_runnable_config(config)
+    # Summarizing is easy; use the cheapest extraction tier.
+    model_name = configuration.extraction_model(0)
+    model = init_model(config, model_name)
+    response = await acached_call(
+        get_response_cache(configuration),
+        make_cache_key(model_name, prompt_text),
+        lambda: model.ainvoke([HumanMessage(content=prompt_text)]),
+        dump=get_message_text,
+        load=lambda text: AIMessage(content=text),
+    )
+    # Summaries replayed from the cache carry no usage metadata and cost no tokens.
+    return get_message_text(response), get_token_usage(response)
+
+
+async def acompact_history(
+    messages: Sequence[BaseMessage],
+    summary: Optional[str],
+    config: Optional[RunnableConfig] = None,
+) -> CompactedHistory:
+    """
+    Apply the configured context strategy to the message history.
+
+    `full` sends everything. `window` keeps the newest messages within
+    `max_context_tokens`. `latest` keeps only the latest answer and its feedback.
+    `summarize` windows like `window` but folds the dropped messages into a running
+    summary. Dropped messages are also removed from the state so the channel stays
+    bounded instead of growing with every loop.
+    """
+    configuration = Configuration.from_runnable_config(config)
+    strategy = configuration.context_strategy
+    if strategy == "full":
+        return CompactedHistory(messages=list(messages), removals=[], summary=summary)
+    if strategy == "latest":
+        kept = latest(messages)
+    elif strategy in ("window", "summarize"):
+        kept = window(messages, configuration.max_context_tokens)
+    else:
+        raise ValueError(f"Unknown context strategy: {strategy!r}")
+
+    kept_ids = {id(m) for m in kept}
+    dropped = [m for m in messages if id(m) not in kept_ids]
+    token_usage: Dict[str, int] = {}
+    if strategy == "summarize" and dropped:
+        summary, token_usage = await asummarize(dropped, summary, config)
+    removals = [RemoveMessage(id=m.id) for m in dropped if m.id]
+    return CompactedHistory(messages=kept, removals=removals, summary=summary, token_usage=token_usage)
@@ -1,53 +1,305 @@
-
+import asyncio
 import json
-from typing import Any, Dict, List, Optional, cast
+from typing import Any, Dict, List, Optional, Tuple, cast
 
-from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
-from langchain_core.runnables import RunnableConfig
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage, message_to_dict, messages_from_dict
+from langchain_core.runnables import Runnable, RunnableConfig
 from langgraph.graph import StateGraph
+from langgraph.types import StreamWriter
 from pydantic import BaseModel, Field
 
+from enrichment.cache import acached_call, get_response_cache, make_cache_key
 from enrichment.configuration import Configuration
+from enrichment.context import CompactedHistory, acompact_history
+from enrichment.instrumentation import instrument
 from enrichment import prompts
-from enrichment.state import InputState, OutputState, State
-from enrichment.utils import init_model
+from enrichment.mapreduce import document_chunks, merge_partials
+from enrichment.retrieval import aretrieve_schema_context
+from enrichment.schema import INFO_TOOL_NAME, CompiledSchema, compile_schema
+from enrichment.state import InputState, OutputState, State, add_usage
+from enrichment.streaming import astream_response, emit_complete_info
+from enrichment.utils import get_token_usage, init_model, split_model_name
 
-async def call_agent_model(
+def _load_cached_message(data: Dict[str, Any]) -> BaseMessage:
+    message = messages_from_dict([data])[0]
+    # Give the replayed message a fresh id so add_messages appends it.
+    message.id = None
+    return message
+
+def _parse_structured_response(
+    response: AIMessage, compiled_schema: CompiledSchema
+) -> Tuple[Optional[Dict[str, Any]], List[BaseMessage]]:
+    """
+    Pull the extracted dict out of the schema tool call and validate it.
+    Every tool call is answered with a ToolMessage, as providers require; schema
+    violations are reported there so the next loop can correct them.
+    """
+    info: Optional[Dict[str, Any]] = None
+    tool_messages: List[BaseMessage] = []
+    for tool_call in response.tool_calls:
+        if tool_call["name"] != INFO_TOOL_NAME or info is not None:
+            tool_messages.append(
+                ToolMessage(content="Ignored.", tool_call_id=tool_call["id"])
+            )
+            continue
+        info = tool_call["args"]
+        errors = compiled_schema.validate(info)
+        if errors:
+            content = "The info does not match the schema:\n" + "\n".join(f"- {e}" for e in errors)
+        else:
+            content = "Info recorded."
+        tool_messages.append(ToolMessage(content=content, tool_call_id=tool_call["id"]))
+    return info, tool_messages
+
+def _prompt_message(
+    prompt_text: str, compiled_schema: CompiledSchema, configuration: Configuration, model_name: str
+) -> HumanMessage:
+    """
+    Build the prompt message. With prompt caching on Anthropic models, the part of the
+    prompt before the first {topic} slot is sent as its own block marked cacheable, so
+    runs sharing a schema reuse it. Other providers cache identical prefixes on their own.
+    """
+    provider, _ = split_model_name(model_name)
+    prefix = compiled_schema.prompt_segments(configuration.prompt)[0]
+    if not (configuration.prompt_caching and provider == "anthropic" and prefix):
+        return HumanMessage(content=prompt_text)
+    return HumanMessage(
+        content=[
+            {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": prompt_text[len(prefix):]},
+        ]
+    )
+
+@instrument
+async def retrieve_context(
     state: State, *, config: Optional[RunnableConfig] = None
 ) -> Dict[str, Any]:
     """
-    Call the LLM to produce an answer based on the provided topic and extraction schema.
-    Since we're not using external tools, we simply format the prompt and pass in the conversation history.
+    Replace the topic with the chunks most relevant to the schema.
+    Every schema property is used as a query against the configured vector store,
+    restricted to the run's knowledge_ids; only the union of the top-k hits is kept.
+    When nothing is retrieved, the original topic is kept.
     """
     configuration = Configuration.from_runnable_config(config)
+    documents = await aretrieve_schema_context(
+        configuration.vector_store,
+        compile_schema(state.extraction_schema),
+        state.knowledge_ids or [],
+        configuration.retrieval_k or 0,
+        configuration.retrieval_score_threshold,
+        mode=configuration.retrieval_mode,
+        rerank=configuration.retrieval_rerank,
+    )
+    if not documents:
+        return {}
+    return {"topic": "\n\n".join(doc.page_content for doc in documents)}
+
+async def _ainvoke_extraction(
+    topic: str,
+    model_name: str,
+    compiled_schema: CompiledSchema,
+    history: CompactedHistory,
+    configuration: Configuration,
+    config: Optional[RunnableConfig],
+    writer: Optional[StreamWriter] = None,
+    *,
+    structured: bool,
+) -> Tuple[AIMessage, bool]:
+    """
+    Ask `model_name` to extract the schema from `topic`, going through the response cache.
+    Returns the response and whether the model was actually called.
+    """
+    # Format the prompt with the extraction schema and topic. The schema part is rendered
+    # once per distinct schema and reused across loops and runs.
+    prompt_text = compiled_schema.render_prompt(configuration.prompt, topic)
+    # Start with the new prompt message, then include the prior messages that the
+    # context strategy keeps; older loops may only survive as a summary.
+    if history.summary:
+        prompt_text += f"\n\nSummary of earlier attempts:\n{history.summary}"
+    messages: List[BaseMessage] = [
+        _prompt_message(prompt_text, compiled_schema, configuration, model_name)
+    ] + history.messages
+
+    # Initialize and call the model, unless the same request was answered before.
+    # In structured mode the model must answer by calling the schema as a tool.
+    chat_model = init_model(config, model_name)
+    model: Runnable[LanguageModelInput, BaseMessage] = (
+        chat_model.bind_tools([compiled_schema.tool], tool_choice=INFO_TOOL_NAME) if structured else chat_model
+    )
+    invoked = False
+
+    async def invoke() -> BaseMessage:
+        nonlocal invoked
+        invoked = True
+        if writer is not None and configuration.stream_partial_info:
+            return await astream_response(model, messages, writer)
+        return await model.ainvoke(messages)
 
-    # Format the prompt with the extraction schema and topic.
-    prompt_text = configuration.prompt.format(
-        info=json.dumps(state.extraction_schema, indent=2),
-        topic=state.topic
+    response = await acached_call(
+        get_response_cache(configuration),
+        make_cache_key(
+            model_name,
+            prompt_text,
+            history.messages,
+            {"extraction_mode": "structured" if structured else "text"},
+        ),
+        invoke,
+        dump=message_to_dict,
+        load=_load_cached_message,
     )
-    # Start with the new prompt message, then include any prior messages.
-    messages: List[BaseMessage] = [HumanMessage(content=prompt_text)] + state.messages
+    return cast(AIMessage, response), invoked
 
-    # Initialize and call the model.
-    model = init_model(config)
-    response = cast(AIMessage, await model.ainvoke(messages))
+@instrument
+async def call_agent_model(
+    state: State, *, config: Optional[RunnableConfig] = None, writer: StreamWriter
+) -> Dict[str, Any]:
+    """
+    Call the LLM to produce an answer based on the provided topic and extraction schema.
+    Since we're not using external tools, we simply format the prompt and pass in the conversation history.
+    With `stream_partial_info`, the answer is streamed and partially parsed fields are
+    emitted on the graph's "custom" stream mode as they appear.
+    """
+    configuration = Configuration.from_runnable_config(config)
+    # Cheap tiers go first; every further loop means the previous answer was rejected.
+    model_name = configuration.extraction_model(state.loop_step)
+    compiled_schema = compile_schema(state.extraction_schema)
+    history = await acompact_history(state.messages, state.history_summary, config)
+    structured = configuration.extraction_mode == "structured"
+    response, invoked = await _ainvoke_extraction(
+        state.topic,
+        model_name,
+        compiled_schema,
+        history,
+        configuration,
+        config,
+        writer,
+        structured=structured,
+    )
 
-    # In this simplified version, we take the LLM's response as the final info.
-    info = response.content
+    info: Any
+    if structured:
+        info, tool_messages = _parse_structured_response(response, compiled_schema)
+    else:
+        # In text mode, we take the LLM's response as the final info.
+        info, tool_messages = response.content, []
+    if configuration.stream_partial_info and not invoked:
+        # Cached answers arrive whole; still report their fields to stream consumers.
+        # Text answers are JSON strings, parsed here the way the validator reads them.
+        emit_complete_info(_answer_as_dict(info), writer)
 
-    new_messages = state.messages + [response]
+    # add_messages appends the new messages and applies the removals.
+    new_messages = history.removals + [response] + tool_messages
     return {
         "messages": new_messages,
+        "history_summary": history.summary,
+        # Answers replayed from the response cache cost no tokens.
+        "token_usage": add_usage(history.token_usage, get_token_usage(response) if invoked else {}),
         "info": info,
-        "loop_step": state.loop_step + 1,
+        "is_satisfactory": None,
+        # loop_step is summed by its reducer, so return the increment, not the new value.
+        "loop_step": 1,
     }
 
+@instrument
+async def extract_chunks(
+    state: State, *, config: Optional[RunnableConfig] = None, writer: StreamWriter
+) -> Dict[str, Any]:
+    """
+    Map-reduce extraction for documents too large for one prompt.
+    Every chunk is extracted against the schema concurrently (up to `map_concurrency`
+    calls at once) and the partial answers are merged with schema-aware rules.
+    """
+    configuration = Configuration.from_runnable_config(config)
+    model_name = configuration.extraction_model(state.loop_step)
+    compiled_schema = compile_schema(state.extraction_schema)
+    history = await acompact_history(state.messages, state.history_summary, config)
+    chunks = document_chunks(state, configuration)
+    semaphore = asyncio.Semaphore(max(configuration.map_concurrency, 1))
+
+    async def extract(chunk: str) -> Tuple[Optional[Dict[str, Any]], Dict[str, int]]:
+        async with semaphore:
+            response, invoked = await _ainvoke_extraction(
+                chunk,
+                model_name,
+                compiled_schema,
+                history,
+                configuration,
+                config,
+                structured=True,
+            )
+        partial, _ = _parse_structured_response(response, compiled_schema)
+        return partial, get_token_usage(response) if invoked else {}
+
+    results = await asyncio.gather(*(extract(chunk) for chunk in chunks))
+    info = merge_partials(compiled_schema.schema, [partial for partial, _ in results])
+    token_usage = history.token_usage
+    for _, usage in results:
+        token_usage = add_usage(token_usage, usage)
+    if configuration.stream_partial_info:
+        emit_complete_info(info, writer)
+
+    # Only the merged answer enters the history; the per-chunk calls stay out of it.
+    response = AIMessage(content=json.dumps(info))
+    return {
+        "messages": history.removals + [response],
+        "history_summary": history.summary,
+        "token_usage": token_usage,
+        "info": info,
+        "is_satisfactory": None,
+        # loop_step is summed by its reducer, so return the increment, not the new value.
+        "loop_step": 1,
+    }
+
+def _answer_as_dict(info: Any) -> Optional[Dict[str, Any]]:
+    """Return the answer as a dict, parsing JSON text answers; None if it is not one."""
+    if isinstance(info, dict):
+        return info
+    if not isinstance(info, str):
+        return None
+    text = info.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[text.find("\n") + 1:] if "\n" in text else text
+    try:
+        parsed = json.loads(text)
+    except ValueError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+@instrument
+def validate_answer(
+    state: State, *, config: Optional[RunnableConfig] = None
+) -> Dict[str, Any]:
+    """
+    Check the answer against the extraction schema without calling the LLM.
+    A valid answer with every schema property present and filled in is accepted
+    outright. Schema violations are turned into feedback, and answers that are not
+    JSON or that omit or leave properties empty are left for the LLM reviewer to judge.
+    """
+    answer = _answer_as_dict(state.info)
+    if answer is None:
+        return {"is_satisfactory": None}
+    errors = compile_schema(state.extraction_schema).validate(answer)
+    if errors:
+        feedback = "The answer does not match the schema:\n" + "\n".join(f"- {e}" for e in errors)
+        return {
+            "is_satisfactory": False,
+            "messages": [HumanMessage(content=f"Feedback: {feedback}")],
+        }
+    # Properties the answer omits count as empty: the schema only requires some of them.
+    properties = state.extraction_schema.get("properties") or {}
+    values = [*answer.values(), *(None for name in properties if name not in answer)]
+    if any(value is None or value == "" or value == [] or value == {} for value in values):
+        return {"is_satisfactory": None}
+    return {"is_satisfactory": True}
+
 # A simplified reflection step that asks the LLM if the answer is satisfactory.
 class ReflectionResult(BaseModel):
     is_satisfactory: bool = Field(..., description="Whether the answer is satisfactory.")
     feedback: str = Field(..., description="Feedback on the answer.")
 
+@instrument
 async def reflect(
     state: State, *, config: Optional[RunnableConfig] = None
 ) -> Dict[str, Any]:
@@ -55,37 +307,102 @@ async def reflect(
     Use the LLM to review the answer.
     The model is asked to confirm if the provided answer is satisfactory.
     """
+    answer = state.info if isinstance(state.info, str) else json.dumps(state.info, indent=2)
     prompt_text = (
         "Review the following answer and determine if it adequately addresses the topic.\n\n"
-        f"Answer:\n{state.info}\n\n"
+        f"Answer:\n{answer}\n\n"
         "Respond with 'Yes' if the answer is satisfactory; otherwise, include feedback and suggestions."
     )
     messages: List[BaseMessage] = [HumanMessage(content=prompt_text)]
-    model = init_model(config).with_structured_output(ReflectionResult)
-    reflection: ReflectionResult = await model.ainvoke(messages)
+    configuration = Configuration.from_runnable_config(config)
+    model = init_model(config, configuration.review_model).with_structured_output(
+        ReflectionResult, include_raw=True
+    )
+
+    async def review() -> Dict[str, Any]:
+        result = cast(Dict[str, Any], await model.ainvoke(messages))
+        if result["parsing_error"] is not None:
+            raise result["parsing_error"]
+        return result
+
+    reviewed = await acached_call(
+        get_response_cache(configuration),
+        make_cache_key(configuration.review_model, prompt_text),
+        review,
+        dump=lambda result: result["parsed"].model_dump(),
+        load=lambda data: {"raw": None, "parsed": ReflectionResult.model_validate(data)},
+        message=lambda result: result["raw"],
+    )
+    reflection = cast(ReflectionResult, reviewed["parsed"])
+    # Reviews replayed from the response cache have no raw message and cost no tokens.
+    token_usage = get_token_usage(reviewed["raw"])
 
     # If the answer is satisfactory, we finish. Otherwise, we can loop for improvement.
     if reflection.is_satisfactory:
         return {
             "info": state.info,
+            "is_satisfactory": True,
             "messages": [HumanMessage(content=reflection.feedback)],
+            "token_usage": token_usage,
         }
     else:
         return {
+            "is_satisfactory": False,
             "messages": [HumanMessage(content=f"Feedback: {reflection.feedback}")],
+            "token_usage": token_usage,
         }
 
 ### Routing Functions
 
-def route_after_agent(state: State) -> str:
+def _extraction_node(state: State, configuration: Configuration) -> str:
+    if len(document_chunks(state, configuration)) > 1:
+        return "extract_chunks"
+    return "call_agent_model"
+
+@instrument
+def route_extraction(state: State, config: RunnableConfig) -> str:
+    """
+    Pick the extraction node.
+    Documents given as chunks, or longer than `chunk_size`, go through map-reduce.
+    """
+    return _extraction_node(state, Configuration.from_runnable_config(config))
+
+@instrument
+def route_start(state: State, config: RunnableConfig) -> str:
+    """
+    Retrieve the relevant chunks first when retrieval-scoped extraction is configured.
+    Otherwise pick the extraction node straight away.
+    """
+    configuration = Configuration.from_runnable_config(config)
+    if configuration.retrieval_k and configuration.vector_store is not None and state.knowledge_ids:
+        return "retrieve_context"
+    return _extraction_node(state, configuration)
+
+@instrument
+def route_after_agent(state: State, config: RunnableConfig) -> str:
     """
     Decide the next step.
-    If an answer is produced, move to reflection.
+    If an answer is produced, check it locally first (or go straight to reflection when
+    fast-path validation is disabled). Without an answer, retry until max_loops.
     """
+    configuration = Configuration.from_runnable_config(config)
     if state.info:
-        return "reflect"
-    return "call_agent_model"
+        return "validate_answer" if configuration.fast_path_validation else "reflect"
+    if state.loop_step < configuration.max_loops:
+        return _extraction_node(state, configuration)
+    return "__end__"
+
+@instrument
+def route_after_validation(state: State) -> str:
+    """
+    Finish when the local check accepted the answer.
+    Otherwise escalate to the LLM reviewer.
+    """
+    if state.is_satisfactory:
+        return "__end__"
+    return "reflect"
 
+@instrument
 def route_after_checker(state: State, config: RunnableConfig) -> str:
     """
     Decide whether to iterate or finish.
@@ -93,18 +410,27 @@ def route_after_checker(state: State, config: RunnableConfig) -> str:
     Otherwise, terminate.
     """
     configuration = Configuration.from_runnable_config(config)
-    if state.loop_step < configuration.max_loops and not state.info:
-        return "call_agent_model"
+    if state.loop_step < configuration.max_loops and not state.is_satisfactory:
+        return _extraction_node(state, configuration)
     return "__end__"
 
 ### Workflow Graph
 
-# Create the graph with just the two main nodes.
+# Create the graph: optional retrieval, the agent (single prompt or map-reduce over
+# chunks), a local validator and the LLM reviewer.
 workflow = StateGraph(State, input=InputState, output=OutputState, config_schema=Configuration)
+workflow.add_node(retrieve_context)
 workflow.add_node(call_agent_model)
+workflow.add_node(extract_chunks)
+workflow.add_node(validate_answer)
 workflow.add_node(reflect)
-workflow.add_edge("__start__", "call_agent_model")
+workflow.add_conditional_edges(
+    "__start__", route_start, ["retrieve_context", "call_agent_model", "extract_chunks"]
+)
+workflow.add_conditional_edges("retrieve_context", route_extraction, ["call_agent_model", "extract_chunks"])
 workflow.add_conditional_edges("call_agent_model", route_after_agent)
+workflow.add_conditional_edges("extract_chunks", route_after_agent)
+workflow.add_conditional_edges("validate_answer", route_after_validation)
 workflow.add_conditional_edges("reflect", route_after_checker)
 
 graph = workflow.compile()
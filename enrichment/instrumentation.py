@@ -0,0 +1,263 @@
+### Instrumentation
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import inspect
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from enrichment.utils import get_token_usage
+
+F = TypeVar("F", bound=Callable[..., Any])
+S = TypeVar("S", bound="Sink")
+
+
+@dataclass
+class NodeEvent:
+    """Measurements of a single node (or router) invocation."""
+
+    node: str
+    started_at: float
+    wall_time: float = 0.0
+    model_calls: int = 0
+    model_latency: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_input_tokens: int = 0
+    loop_step: Optional[int] = None
+    cache_hits: int = 0
+    cache_misses: int = 0
+    error: Optional[str] = None
+
+    def __post_init__(self) -> None:
+        # (start, end) of every model call; kept off the dataclass fields so sinks do not export it.
+        self._model_spans: List[Tuple[float, float]] = []
+
+    def add_model_latency(self, latency: float) -> None:
+        """
+        Count a model call of `latency` seconds that ended now. Calls that overlap, such as the
+        concurrent per-chunk calls of a map step, are counted once, so `model_latency` is the
+        time the node spent waiting on the model rather than the sum of all calls.
+        """
+        end = time.perf_counter()
+        self._model_spans.append((end - latency, end))
+        total, reach = 0.0, float("-inf")
+        for start, stop in sorted(self._model_spans):
+            if stop > reach:
+                total += stop - max(start, reach)
+                reach = stop
+        self.model_latency = total
+
+    @property
+    def overhead(self) -> float:
+        """Wall time not spent waiting for the model."""
+        return max(self.wall_time - self.model_latency, 0.0)
+
+
+class Sink(ABC):
+    """Receives a `NodeEvent` after every instrumented invocation."""
+
+    @abstractmethod
+    def record(self, event: NodeEvent) -> None:
+        """Handle one event. Must be cheap and must not raise."""
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Return the nearest-rank `q`-th percentile (0-100) of `values`."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(round(q / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class InMemorySink(Sink):
+    """Keeps every event in memory and aggregates them per node."""
+
+    def __init__(self) -> None:
+        self.events: List[NodeEvent] = []
+        self._lock = threading.Lock()
+
+    def record(self, event: NodeEvent) -> None:
+        with self._lock:
+            self.events.append(event)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.events.clear()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Return count, latency percentiles (seconds), model time and tokens per node."""
+        with self._lock:
+            events = list(self.events)
+        by_node: Dict[str, List[NodeEvent]] = {}
+        for event in events:
+            by_node.setdefault(event.node, []).append(event)
+        summary: Dict[str, Dict[str, float]] = {}
+        for node, node_events in by_node.items():
+            wall = [e.wall_time for e in node_events]
+            model = [e.model_latency for e in node_events]
+            summary[node] = {
+                "count": len(node_events),
+                "errors": sum(1 for e in node_events if e.error),
+                "p50": percentile(wall, 50),
+                "p95": percentile(wall, 95),
+                "p99": percentile(wall, 99),
+                "mean": sum(wall) / len(wall),
+                "model_p50": percentile(model, 50),
+                "model_p95": percentile(model, 95),
+                "overhead_p50": percentile([e.overhead for e in node_events], 50),
+                "model_calls": sum(e.model_calls for e in node_events),
+                "input_tokens": sum(e.input_tokens for e in node_events),
+                "output_tokens": sum(e.output_tokens for e in node_events),
+                "cached_input_tokens": sum(e.cached_input_tokens for e in node_events),
+                "cache_hits": sum(e.cache_hits for e in node_events),
+                "cache_misses": sum(e.cache_misses for e in node_events),
+            }
+        return summary
+
+
+class JsonlSink(Sink):
+    """Appends every event as a JSON line to a file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, event: NodeEvent) -> None:
+        line = json.dumps(asdict(event))
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class OpenTelemetrySink(Sink):
+    """
+    Exports every event as an OpenTelemetry span.
+    Requires the `opentelemetry-api` package; spans go wherever the tracer provider sends them.
+    """
+
+    def __init__(self, tracer: Any = None):
+        if tracer is None:
+            try:
+                from opentelemetry import trace  # type: ignore[import-not-found]
+            except ImportError as e:
+                raise ImportError(
+                    "OpenTelemetrySink requires the opentelemetry-api package. "
+                    "Install it with `pip install opentelemetry-api`."
+                ) from e
+            tracer = trace.get_tracer("enrichment")
+        self.tracer = tracer
+
+    def record(self, event: NodeEvent) -> None:
+        start_ns = int(event.started_at * 1e9)
+        span = self.tracer.start_span(f"enrichment.{event.node}", start_time=start_ns)
+        for key, value in asdict(event).items():
+            if value is not None and key not in ("node", "started_at"):
+                span.set_attribute(f"enrichment.{key}", value)
+        span.end(end_time=start_ns + int(event.wall_time * 1e9))
+
+
+_sinks: List[Sink] = []
+_current_event: contextvars.ContextVar[Optional[NodeEvent]] = contextvars.ContextVar(
+    "enrichment_current_event", default=None
+)
+
+
+def add_sink(sink: S) -> S:
+    """Start sending node events to `sink`. Returns the sink for convenience."""
+    _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink: Sink) -> None:
+    """Stop sending node events to `sink`."""
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+def record_model_call(latency: float, response: Any = None, cache_hit: Optional[bool] = None) -> None:
+    """Attribute a model call to the node invocation that is currently running."""
+    event = _current_event.get()
+    if event is None:
+        return
+    if cache_hit is True:
+        event.cache_hits += 1
+        return
+    if cache_hit is False:
+        event.cache_misses += 1
+    event.model_calls += 1
+    event.add_model_latency(latency)
+    usage = get_token_usage(response) if response is not None else {}
+    event.input_tokens += usage.get("input_tokens", 0)
+    event.output_tokens += usage.get("output_tokens", 0)
+    event.cached_input_tokens += usage.get("cached_input_tokens", 0)
+
+
+def _emit(event: NodeEvent) -> None:
+    for sink in list(_sinks):
+        try:
+            sink.record(event)
+        except Exception:
+            # Instrumentation must never break a run.
+            pass
+
+
+def _start(fn: Callable[..., Any], args: tuple) -> NodeEvent:
+    state = args[0] if args else None
+    return NodeEvent(
+        node=fn.__name__,
+        started_at=time.time(),
+        loop_step=getattr(state, "loop_step", None),
+    )
+
+
+def instrument(fn: F) -> F:
+    """
+    Record a `NodeEvent` for every call of a graph node or router.
+    Costs a single check per call while no sink is registered.
+    """
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _sinks:
+                return await fn(*args, **kwargs)
+            event = _start(fn, args)
+            token = _current_event.set(event)
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                event.error = repr(e)
+                raise
+            finally:
+                event.wall_time = time.perf_counter() - started
+                _current_event.reset(token)
+                _emit(event)
+
+        return async_wrapper  # type: ignore[return-value]
+
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not _sinks:
+            return fn(*args, **kwargs)
+        event = _start(fn, args)
+        token = _current_event.set(event)
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            event.error = repr(e)
+            raise
+        finally:
+            event.wall_time = time.perf_counter() - started
+            _current_event.reset(token)
+            _emit(event)
+
+    return wrapper  # type: ignore[return-value]
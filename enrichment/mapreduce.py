@@ -0,0 +1,101 @@
+### Map-Reduce Extraction Helpers
+
+from __future__ import annotations
+
+import json
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from enrichment.configuration import Configuration
+from enrichment.state import State
+
+
+@lru_cache(maxsize=32)
+def split_text(text: str, chunk_size: int) -> Tuple[str, ...]:
+    """
+    Split `text` into chunks of at most `chunk_size` characters.
+    Cuts at paragraph breaks where possible, then at line breaks, then anywhere.
+    """
+    chunks: List[str] = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            for separator in ("\n\n", "\n", " "):
+                cut = text.rfind(separator, start + chunk_size // 2, end)
+                if cut > start:
+                    end = cut + len(separator)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = end
+    return tuple(chunks)
+
+
+def document_chunks(state: State, configuration: Configuration) -> Sequence[str]:
+    """
+    Return the chunks the document of this run is made of.
+    Explicit `chunks` win; otherwise the topic is split when it exceeds `chunk_size`.
+    """
+    if state.chunks:
+        return state.chunks
+    if configuration.chunk_size and len(state.topic) > configuration.chunk_size:
+        return split_text(state.topic, configuration.chunk_size)
+    return (state.topic,)
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _canonical(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, default=repr)
+
+
+def merge_values(schema: Dict[str, Any], values: List[Any]) -> Any:
+    """
+    Merge the values extracted for one schema node from several chunks, in chunk order.
+
+    Objects are merged property by property. Arrays are unioned, keeping the first
+    occurrence of every item. Scalars are voted on; ties go to the earliest chunk.
+    Empty values never win over non-empty ones.
+    """
+    present = [v for v in values if not _is_empty(v)]
+    if not present:
+        return values[0] if values else None
+    types = schema.get("type")
+    if isinstance(types, list):
+        types = next((t for t in types if t != "null"), None)
+    if types == "object" or (types is None and all(isinstance(v, dict) for v in present)):
+        objects = [v for v in present if isinstance(v, dict)]
+        properties = schema.get("properties") or {}
+        keys: List[str] = []
+        for obj in objects:
+            keys.extend(k for k in obj if k not in keys)
+        merged: Dict[str, Any] = {}
+        for key in keys:
+            value = merge_values(properties.get(key) or {}, [obj[key] for obj in objects if key in obj])
+            if value is not None:
+                merged[key] = value
+        return merged
+    if types == "array" or (types is None and all(isinstance(v, list) for v in present)):
+        seen = set()
+        union: List[Any] = []
+        for value in present:
+            for item in value if isinstance(value, list) else [value]:
+                key = _canonical(item)
+                if key not in seen:
+                    seen.add(key)
+                    union.append(item)
+        return union
+    votes = Counter(_canonical(v) for v in present)
+    best = max(votes.values())
+    return next(v for v in present if votes[_canonical(v)] == best)
+
+
+def merge_partials(schema: Dict[str, Any], partials: Sequence[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Merge per-chunk answers into one answer for the whole document."""
+    merged = merge_values(schema, [p for p in partials if isinstance(p, dict)])
+    return merged if isinstance(merged, dict) else {}
@@ -0,0 +1,113 @@
+### Retrieval-Scoped Extraction
+
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from enrichment.schema import CompiledSchema
+
+QUERY_CACHE_SIZE = 64
+
+_query_cache: "OrderedDict[Tuple[str, int], Tuple[Embeddings, List[str], List[List[float]]]]" = OrderedDict()
+_query_cache_lock = threading.Lock()
+
+
+def property_queries(schema: Dict[str, Any]) -> List[str]:
+    """Build one retrieval query per top-level schema property from its name and description."""
+    queries = []
+    for name, spec in (schema.get("properties") or {}).items():
+        description = spec.get("description") if isinstance(spec, dict) else None
+        queries.append(f"{name}: {description}" if description else name)
+    return queries
+
+
+async def aembed_property_queries(
+    compiled_schema: CompiledSchema, embeddings: Embeddings
+) -> Tuple[List[str], List[List[float]]]:
+    """
+    Return the property queries of a schema and their embeddings.
+    Embeddings are computed once per schema and embedding model, then served from memory.
+    """
+    key = (compiled_schema.hash, id(embeddings))
+    with _query_cache_lock:
+        entry = _query_cache.get(key)
+        # Holding the embeddings object guarantees its id is not reused.
+        if entry is not None and entry[0] is embeddings:
+            _query_cache.move_to_end(key)
+            return entry[1], entry[2]
+    queries = property_queries(compiled_schema.schema)
+    vectors = await embeddings.aembed_documents(queries) if queries else []
+    with _query_cache_lock:
+        _query_cache[key] = (embeddings, queries, vectors)
+        while len(_query_cache) > QUERY_CACHE_SIZE:
+            _query_cache.popitem(last=False)
+    return queries, vectors
+
+
+async def aretrieve_schema_context(
+    vector_store: Any,
+    compiled_schema: CompiledSchema,
+    knowledge_ids: Sequence[str],
+    k: int,
+    score_threshold: Optional[float] = None,
+    mode: str = "vector",
+    rerank: bool = False,
+) -> List[Document]:
+    """
+    Retrieve the chunks relevant to any property of the schema.
+
+    Runs one top-k similarity search per property, restricted to `knowledge_ids`, and
+    returns the union of the hits without duplicates, best score first. `vector_store`
+    is a `CustomSupabaseVectorStore` or anything with the same
+    `similarity_search_by_vector_with_relevance_scores` method and `embeddings`. Stores
+    that also offer `similarity_search_by_vectors_with_relevance_scores` get all the
+    queries in one batch call. In `hybrid` mode each property query goes through the
+    store's `hybrid_search` with its text and embedding instead.
+    """
+    queries, vectors = await aembed_property_queries(compiled_schema, vector_store.embeddings)
+    if not vectors:
+        return []
+    search_filter = json.dumps({"knowledge_ids": list(knowledge_ids)})
+
+    batch_search = getattr(vector_store, "similarity_search_by_vectors_with_relevance_scores", None)
+    if mode == "hybrid":
+        results = await asyncio.gather(
+            *(
+                asyncio.to_thread(
+                    vector_store.hybrid_search,
+                    query,
+                    vector,
+                    k=k,
+                    filter=search_filter,
+                    score_threshold=score_threshold,
+                    rerank=rerank,
+                )
+                for query, vector in zip(queries, vectors)
+            )
+        )
+    elif batch_search is not None:
+        results = await asyncio.to_thread(
+            batch_search, vectors, k=k, filter=search_filter, score_threshold=score_threshold
+        )
+    else:
+
+        def search(vector: List[float]) -> List[Tuple[Document, float]]:
+            return vector_store.similarity_search_by_vector_with_relevance_scores(
+                vector, k=k, filter=search_filter, score_threshold=score_threshold
+            )
+
+        results = await asyncio.gather(*(asyncio.to_thread(search, v) for v in vectors))
+    best: Dict[Any, Tuple[Document, float]] = {}
+    for hits in results:
+        for doc, score in hits:
+            key = doc.metadata.get("id") or doc.page_content
+            if key not in best or score > best[key][1]:
+                best[key] = (doc, score)
+    return [doc for doc, _ in sorted(best.values(), key=lambda hit: hit[1], reverse=True)]
@@ -0,0 +1,250 @@
+### Compiled Extraction Schemas
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Tuple
+
+# Compiled schemas are looked up by object identity first, confirmed against a snapshot of
+# the schema, and by canonical hash second.
+SCHEMA_CACHE_SIZE = 256
+INFO_TOOL_NAME = "Info"
+
+_TOPIC_SENTINEL = "\x00__enrichment_topic__\x00"
+
+# A validator takes a value and its JSON path and returns the list of violations.
+Validator = Callable[[Any, str], List[str]]
+
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+
+def compile_validator(schema: Dict[str, Any]) -> Validator:
+    """
+    Compile a JSON schema into a validation function.
+
+    Covers the keywords extraction schemas use in practice: `type`, `enum`, `const`,
+    `properties`, `required`, `additionalProperties`, `items`, `minItems`, `maxItems`,
+    `minLength`, `maxLength`, `minimum`, `maximum` and `anyOf`/`oneOf`. Unknown keywords
+    (including `$ref`) are accepted without checking.
+    """
+    if not isinstance(schema, dict):
+        return lambda value, path: []
+
+    types = schema.get("type")
+    type_names = [types] if isinstance(types, str) else list(types or [])
+    type_checks = [_TYPE_CHECKS[t] for t in type_names if t in _TYPE_CHECKS]
+    checks: List[Validator] = []
+
+    if "enum" in schema:
+        allowed = schema["enum"]
+        checks.append(
+            lambda v, p: [] if v in allowed else [f"{p}: {v!r} is not one of {allowed!r}"]
+        )
+    if "const" in schema:
+        const = schema["const"]
+        checks.append(lambda v, p: [] if v == const else [f"{p}: expected {const!r}"])
+
+    properties = {
+        name: compile_validator(sub) for name, sub in (schema.get("properties") or {}).items()
+    }
+    required = list(schema.get("required") or [])
+    additional = schema.get("additionalProperties", True)
+    additional_validator = compile_validator(additional) if isinstance(additional, dict) else None
+    if properties or required or additional is not True:
+
+        def check_object(value: Any, path: str) -> List[str]:
+            if not isinstance(value, dict):
+                return []
+            errors = [
+                f"{path}: missing required property '{name}'"
+                for name in required
+                if name not in value
+            ]
+            for name, item in value.items():
+                validator = properties.get(name)
+                if validator is not None:
+                    errors.extend(validator(item, f"{path}.{name}"))
+                elif additional is False:
+                    errors.append(f"{path}: unexpected property '{name}'")
+                elif additional_validator is not None:
+                    errors.extend(additional_validator(item, f"{path}.{name}"))
+            return errors
+
+        checks.append(check_object)
+
+    items = schema.get("items")
+    item_validator = compile_validator(items) if isinstance(items, dict) else None
+    min_items, max_items = schema.get("minItems"), schema.get("maxItems")
+    if item_validator is not None or min_items is not None or max_items is not None:
+
+        def check_array(value: Any, path: str) -> List[str]:
+            if not isinstance(value, list):
+                return []
+            errors = []
+            if min_items is not None and len(value) < min_items:
+                errors.append(f"{path}: expected at least {min_items} items")
+            if max_items is not None and len(value) > max_items:
+                errors.append(f"{path}: expected at most {max_items} items")
+            if item_validator is not None:
+                for index, item in enumerate(value):
+                    errors.extend(item_validator(item, f"{path}[{index}]"))
+            return errors
+
+        checks.append(check_array)
+
+    min_length, max_length = schema.get("minLength"), schema.get("maxLength")
+    if min_length is not None or max_length is not None:
+
+        def check_string(value: Any, path: str) -> List[str]:
+            if not isinstance(value, str):
+                return []
+            if min_length is not None and len(value) < min_length:
+                return [f"{path}: shorter than {min_length} characters"]
+            if max_length is not None and len(value) > max_length:
+                return [f"{path}: longer than {max_length} characters"]
+            return []
+
+        checks.append(check_string)
+
+    minimum, maximum = schema.get("minimum"), schema.get("maximum")
+    if minimum is not None or maximum is not None:
+
+        def check_number(value: Any, path: str) -> List[str]:
+            if not _TYPE_CHECKS["number"](value):
+                return []
+            if minimum is not None and value < minimum:
+                return [f"{path}: {value} is less than {minimum}"]
+            if maximum is not None and value > maximum:
+                return [f"{path}: {value} is greater than {maximum}"]
+            return []
+
+        checks.append(check_number)
+
+    alternatives = [compile_validator(sub) for sub in schema.get("anyOf") or schema.get("oneOf") or []]
+    if alternatives:
+
+        def check_alternatives(value: Any, path: str) -> List[str]:
+            if any(not alternative(value, path) for alternative in alternatives):
+                return []
+            return [f"{path}: does not match any of the allowed schemas"]
+
+        checks.append(check_alternatives)
+
+    def validate(value: Any, path: str) -> List[str]:
+        if type_checks and not any(check(value) for check in type_checks):
+            return [f"{path}: expected {' or '.join(type_names)}, got {type(value).__name__}"]
+        errors: List[str] = []
+        for check in checks:
+            errors.extend(check(value, path))
+        return errors
+
+    return validate
+
+
+@dataclass(frozen=True)
+class CompiledSchema:
+    """Everything derived from an extraction schema that does not depend on the topic."""
+
+    schema: Dict[str, Any]
+    hash: str
+    rendered: str
+    tool: Dict[str, Any]
+    validator: Validator = field(repr=False, compare=False)
+    _prompt_segments: Dict[str, List[str]] = field(
+        default_factory=dict, repr=False, compare=False
+    )
+
+    def prompt_segments(self, template: str) -> List[str]:
+        """
+        Return `template` formatted with this schema, split around every `{topic}` slot.
+        The result is computed once per template.
+        """
+        segments = self._prompt_segments.get(template)
+        if segments is None:
+            formatted = template.format(info=self.rendered, topic=_TOPIC_SENTINEL)
+            segments = formatted.split(_TOPIC_SENTINEL)
+            self._prompt_segments[template] = segments
+        return segments
+
+    def render_prompt(self, template: str, topic: str) -> str:
+        """Format `template` with this schema and `topic`, like `template.format(info=..., topic=...)`."""
+        return topic.join(self.prompt_segments(template))
+
+    def validate(self, value: Any) -> List[str]:
+        """Return the schema violations of `value`; an empty list means it is valid."""
+        return self.validator(value, "$")
+
+
+def schema_hash(schema: Dict[str, Any]) -> str:
+    """Return a hash of the schema that does not depend on key order."""
+    canonical = json.dumps(schema, sort_keys=True, separators=(",", ":"), default=repr)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _build(schema: Dict[str, Any], digest: str) -> CompiledSchema:
+    tool = {
+        "name": INFO_TOOL_NAME,
+        "description": schema.get(
+            "description",
+            "Call this when you have gathered all the relevant info.",
+        ),
+        "parameters": schema,
+    }
+    return CompiledSchema(
+        schema=schema,
+        hash=digest,
+        rendered=json.dumps(schema, indent=2),
+        tool=tool,
+        validator=compile_validator(schema),
+    )
+
+
+# Identity entries hold the caller's dict (so its id is not reused) and a snapshot of its
+# contents; a dict changed in place since it was compiled no longer matches its snapshot.
+_by_identity: "OrderedDict[int, Tuple[Dict[str, Any], Dict[str, Any], CompiledSchema]]" = OrderedDict()
+_by_hash: "OrderedDict[str, CompiledSchema]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def compile_schema(schema: Dict[str, Any]) -> CompiledSchema:
+    """
+    Return the compiled form of an extraction schema.
+    Equal schemas share one `CompiledSchema`, so its rendering is paid once per process.
+    The compiled form keeps its own copy of the schema; later changes to `schema` are
+    picked up by the next call instead of altering what was compiled.
+    """
+    with _lock:
+        entry = _by_identity.get(id(schema))
+        if entry is not None and entry[0] is schema and entry[1] == schema:
+            _by_identity.move_to_end(id(schema))
+            return entry[2]
+
+    digest = schema_hash(schema)
+    with _lock:
+        compiled = _by_hash.get(digest)
+        if compiled is None:
+            compiled = _build(copy.deepcopy(schema), digest)
+            _by_hash[digest] = compiled
+            while len(_by_hash) > SCHEMA_CACHE_SIZE:
+                _by_hash.popitem(last=False)
+        else:
+            _by_hash.move_to_end(digest)
+        for known in (schema, compiled.schema):
+            _by_identity[id(known)] = (known, copy.deepcopy(known), compiled)
+            _by_identity.move_to_end(id(known))
+        while len(_by_identity) > SCHEMA_CACHE_SIZE:
+            _by_identity.popitem(last=False)
+        return compiled
@@ -1,24 +1,37 @@
 import operator
 from dataclasses import dataclass, field
-from typing import Annotated, Any, List, Optional
+from typing import Annotated, Any, Dict, List, Optional
 
 from langchain_core.messages import BaseMessage
 from langgraph.graph import add_messages
 
+def add_usage(left: Dict[str, int], right: Dict[str, int]) -> Dict[str, int]:
+    """Sum token counts key by key."""
+    merged = dict(left or {})
+    for key, value in (right or {}).items():
+        merged[key] = merged.get(key, 0) + value
+    return merged
+
 @dataclass(kw_only=True)
 class InputState:
     """Initial state passed in by the user."""
     topic: str
     extraction_schema: dict[str, Any]
     info: Optional[dict[str, Any]] = None
+    chunks: Optional[List[str]] = None
+    knowledge_ids: Optional[List[str]] = None
 
 @dataclass(kw_only=True)
 class State(InputState):
     """Internal state of the agent."""
     messages: Annotated[List[BaseMessage], add_messages] = field(default_factory=list)
     loop_step: Annotated[int, operator.add] = field(default=0)
+    is_satisfactory: Optional[bool] = field(default=None)
+    history_summary: Optional[str] = field(default=None)
+    token_usage: Annotated[Dict[str, int], add_usage] = field(default_factory=dict)
 
 @dataclass(kw_only=True)
 class OutputState:
     """Final output delivered to the user."""
-    info: dict[str, Any]
\ No newline at end of file
+    info: dict[str, Any]
+    token_usage: Dict[str, int] = field(default_factory=dict)
\ No newline at end of file
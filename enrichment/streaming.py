@@ -0,0 +1,103 @@
+### Streaming Partial Results
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional, Sequence, cast
+
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, message_chunk_to_message
+from langchain_core.runnables import Runnable
+from langchain_core.utils.json import parse_partial_json
+from langgraph.types import StreamWriter
+
+from enrichment.schema import INFO_TOOL_NAME
+
+
+def parse_partial_info(message: AIMessageChunk) -> Optional[Dict[str, Any]]:
+    """
+    Parse the info contained in a partially received message.
+    Uses the arguments of the schema tool call when there is one, and otherwise
+    tries to read the text as an unfinished JSON object.
+    """
+    for tool_call in message.tool_calls:
+        if tool_call["name"] == INFO_TOOL_NAME:
+            return tool_call["args"]
+    content = message.content
+    if not isinstance(content, str):
+        return None
+    text = content.lstrip()
+    if text.startswith("```"):
+        text = text[text.find("\n") + 1:] if "\n" in text else ""
+    start = text.find("{")
+    if start < 0:
+        return None
+    try:
+        parsed = parse_partial_json(text[start:].rstrip().rstrip("`"))
+    except ValueError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+class PartialInfoTracker:
+    """
+    Turn a sequence of partial info dicts into stream events.
+
+    Every change emits a `partial_info` event with the whole partial dict. A top-level
+    field is final once a later field has started (or the stream ended) and is emitted
+    as an `info_field` event; array items are emitted as `info_item` events as soon as
+    the next item has started.
+    """
+
+    def __init__(self, writer: StreamWriter):
+        self.writer = writer
+        self.last: Optional[Dict[str, Any]] = None
+        self.fields_done: set = set()
+        self.items_done: Dict[str, int] = {}
+
+    def update(self, partial: Optional[Dict[str, Any]], *, final: bool = False) -> None:
+        if partial is None:
+            return
+        if partial != self.last:
+            self.writer({"type": "partial_info", "info": partial})
+            self.last = partial
+        keys = list(partial)
+        for position, key in enumerate(keys):
+            is_last = position == len(keys) - 1
+            value = partial[key]
+            if isinstance(value, list):
+                complete_items = len(value) if (final or not is_last) else len(value) - 1
+                for index in range(self.items_done.get(key, 0), complete_items):
+                    self.writer({"type": "info_item", "field": key, "index": index, "item": value[index]})
+                self.items_done[key] = max(self.items_done.get(key, 0), complete_items)
+            if key not in self.fields_done and (final or not is_last):
+                self.writer({"type": "info_field", "field": key, "value": value})
+                self.fields_done.add(key)
+
+
+async def astream_response(
+    model: Runnable[LanguageModelInput, BaseMessage],
+    messages: Sequence[BaseMessage],
+    writer: StreamWriter,
+) -> AIMessage:
+    """
+    Stream the model's answer, emitting partial info events through `writer`.
+    Returns the complete message, as `ainvoke` would.
+    """
+    tracker = PartialInfoTracker(writer)
+    aggregate: Optional[AIMessageChunk] = None
+    async for chunk in model.astream(list(messages)):
+        # Chat models stream AIMessageChunks, which add up to the whole message.
+        message_chunk = cast(AIMessageChunk, chunk)
+        aggregate = message_chunk if aggregate is None else aggregate + message_chunk
+        tracker.update(parse_partial_info(aggregate))
+    if aggregate is None:
+        return AIMessage(content="")
+    tracker.update(parse_partial_info(aggregate), final=True)
+    return cast(AIMessage, message_chunk_to_message(aggregate))
+
+
+def emit_complete_info(info: Any, writer: StreamWriter) -> None:
+    """Emit the events of an answer that was not streamed, such as a cached one; `info` must be a parsed dict."""
+    if isinstance(info, dict):
+        PartialInfoTracker(writer).update(info, final=True)
+
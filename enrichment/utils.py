@@ -1,13 +1,26 @@
 ### Utility Functions
 
-from typing import Optional
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
 from langchain.chat_models import init_chat_model
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import AnyMessage
+from langchain_core.messages import AnyMessage, BaseMessage
 from langchain_core.runnables import RunnableConfig
 from enrichment.configuration import Configuration
 
-def get_message_text(msg: AnyMessage) -> str:
+# Process-wide registry of initialized chat models. Reusing an instance keeps its HTTP
+# client (and keep-alive connection pool) alive across node calls and graph runs.
+MODEL_CACHE_SIZE = 32
+_model_cache: "OrderedDict[Tuple[Optional[str], str, str], BaseChatModel]" = OrderedDict()
+# Factories for providers that init_chat_model does not know, such as local fakes.
+_model_factories: Dict[str, Callable[..., BaseChatModel]] = {}
+# init_model never awaits, so it cannot interleave under asyncio; the lock covers
+# graphs driven from several threads.
+_model_cache_lock = threading.Lock()
+
+def get_message_text(msg: BaseMessage) -> str:
     """Extract text from a message."""
     content = msg.content
     if isinstance(content, str):
@@ -18,15 +31,88 @@ def get_message_text(msg: AnyMessage) -> str:
         txts = [c if isinstance(c, str) else (c.get("text") or "") for c in content]
         return "".join(txts).strip()
 
-def init_model(config: Optional[RunnableConfig] = None) -> BaseChatModel:
+def get_token_usage(msg: AnyMessage) -> Dict[str, int]:
     """
-    Initialize the chat model specified in the configuration.
+    Extract token counts from a model response.
+    Input tokens are split into those read from the provider's prompt cache and the rest.
     """
-    configuration = Configuration.from_runnable_config(config)
-    fully_specified_name = configuration.model
+    usage = getattr(msg, "usage_metadata", None)
+    if not usage:
+        return {}
+    details = usage.get("input_token_details") or {}
+    cache_read = details.get("cache_read") or 0
+    cache_creation = details.get("cache_creation") or 0
+    input_tokens = usage.get("input_tokens") or 0
+    return {
+        "input_tokens": input_tokens,
+        "output_tokens": usage.get("output_tokens") or 0,
+        "cached_input_tokens": cache_read,
+        "cache_creation_input_tokens": cache_creation,
+        "uncached_input_tokens": input_tokens - cache_read,
+    }
+
+def split_model_name(fully_specified_name: str) -> Tuple[Optional[str], str]:
+    """Split a `provider/model-name` string into its provider and model parts."""
     if "/" in fully_specified_name:
         provider, model = fully_specified_name.split("/", maxsplit=1)
-    else:
-        provider = None
-        model = fully_specified_name
-    return init_chat_model(model, model_provider=provider)
+        return provider, model
+    return None, fully_specified_name
+
+def register_model_provider(provider: str, factory: Callable[..., BaseChatModel]) -> None:
+    """
+    Make `provider/...` model names resolve through `factory(model, **kwargs)`.
+    Cached models of that provider are dropped so the new factory takes effect.
+    """
+    with _model_cache_lock:
+        _model_factories[provider] = factory
+        for key in [k for k in _model_cache if k[0] == provider]:
+            del _model_cache[key]
+
+def get_chat_model(model: str, *, provider: Optional[str] = None, **kwargs: Any) -> BaseChatModel:
+    """
+    Return a shared chat model for the given provider, model and keyword arguments.
+    Instances are created on first use and kept in a bounded LRU registry.
+    """
+    key = (provider, model, json.dumps(kwargs, sort_keys=True, default=repr))
+    with _model_cache_lock:
+        instance = _model_cache.get(key)
+        if instance is None:
+            factory = _model_factories.get(provider) if provider else None
+            if factory is not None:
+                instance = factory(model, **kwargs)
+            else:
+                instance = init_chat_model(model, model_provider=provider, **kwargs)
+            _model_cache[key] = instance
+            while len(_model_cache) > MODEL_CACHE_SIZE:
+                _model_cache.popitem(last=False)
+        else:
+            _model_cache.move_to_end(key)
+        return instance
+
+def invalidate_model_cache(fully_specified_name: Optional[str] = None) -> int:
+    """
+    Drop cached chat models so the next call rebuilds them.
+    Without an argument the whole registry is cleared. Returns the number of evicted models.
+    """
+    with _model_cache_lock:
+        if fully_specified_name is None:
+            evicted = len(_model_cache)
+            _model_cache.clear()
+            return evicted
+        provider, model = split_model_name(fully_specified_name)
+        keys = [k for k in _model_cache if k[1] == model and (provider is None or k[0] == provider)]
+        for k in keys:
+            del _model_cache[k]
+        return len(keys)
+
+def init_model(
+    config: Optional[RunnableConfig] = None, model_name: Optional[str] = None
+) -> BaseChatModel:
+    """
+    Initialize the chat model specified in the configuration, or `model_name` if given.
+    The instance is shared through the model registry, see `get_chat_model`.
+    """
+    if model_name is None:
+        model_name = Configuration.from_runnable_config(config).model
+    provider, model = split_model_name(model_name)
+    return get_chat_model(model, provider=provider)
@@ -0,0 +1,328 @@
+import asyncio
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import httpx
+from supabase import AsyncClient, acreate_client
+from supabase.lib.client_options import AsyncClientOptions
+
+from ai_assistant.vector_store.supabase_db import (
+    SUPABASE_SERVICE_KEY,
+    SUPABASE_URL,
+    _chunk_page_query,
+    _chunks_from_page,
+    chunks_from_rows,
+    normalize_knowledge_ids,
+    order_contents,
+    summaries_from_rows,
+)
+from ai_assistant.vector_store.knowledge_cache import (
+    KnowledgeCache,
+    _summary_query,
+    _version_query,
+    _versions_from_rows,
+    get_knowledge_cache,
+    resolve_stale,
+    summary_versions,
+)
+
+# One pooled HTTP client is shared by every async query of an event loop, so connections are
+# kept alive and reused; the semaphore caps how many queries are in flight at once. httpx clients
+# and asyncio primitives are bound to the loop they were first used on, so each loop gets its own
+# set: a later `asyncio.run` starts with a fresh client instead of one tied to a closed loop.
+MAX_CONNECTIONS = 20
+MAX_CONCURRENT_REQUESTS = 10
+
+
+@dataclass
+class _LoopClient:
+    init_lock: asyncio.Lock
+    client: Optional[AsyncClient] = None
+    http_client: Optional[httpx.AsyncClient] = None
+    request_slots: Optional[asyncio.Semaphore] = None
+
+
+_loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopClient]" = weakref.WeakKeyDictionary()
+_loop_clients_lock = threading.Lock()
+
+
+def _get_loop_client() -> _LoopClient:
+    loop = asyncio.get_running_loop()
+    with _loop_clients_lock:
+        loop_client = _loop_clients.get(loop)
+        if loop_client is None:
+            loop_client = _loop_clients[loop] = _LoopClient(asyncio.Lock())
+        return loop_client
+
+
+async def initialize_async_supabase(
+    max_connections: int = MAX_CONNECTIONS,
+    max_concurrent_requests: int = MAX_CONCURRENT_REQUESTS,
+) -> AsyncClient:
+    """
+    Initialize the shared async Supabase client of the running event loop.
+    The first call on a loop creates the pooled HTTP client; later calls on it return the same client.
+    Call `close_async_supabase` before the loop ends to release its connections.
+    Returns: Async Supabase client instance
+    """
+    loop_client = _get_loop_client()
+    async with loop_client.init_lock:
+        if loop_client.client is not None:
+            return loop_client.client
+        if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+            raise ValueError("Missing required Supabase credentials")
+
+        http_client = httpx.AsyncClient(
+            timeout=1000,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+        client = await acreate_client(
+            SUPABASE_URL,
+            SUPABASE_SERVICE_KEY,
+            options=AsyncClientOptions(
+                postgrest_client_timeout=1000,
+                storage_client_timeout=1000,
+                schema="public",
+                httpx_client=http_client,
+            ),
+        )
+        loop_client.http_client = http_client
+        loop_client.request_slots = asyncio.Semaphore(max_concurrent_requests)
+        loop_client.client = client
+        return client
+
+
+async def close_async_supabase() -> None:
+    """
+    Close the shared client of the running event loop and its connection pool.
+    """
+    loop_client = _get_loop_client()
+    async with loop_client.init_lock:
+        if loop_client.http_client is not None:
+            await loop_client.http_client.aclose()
+        loop_client.client = None
+        loop_client.http_client = None
+        loop_client.request_slots = None
+
+
+async def aexecute(query):
+    """
+    Execute a query builder, waiting for a free request slot of the running loop first.
+    """
+    request_slots = _get_loop_client().request_slots
+    if request_slots is None:
+        return await query.execute()
+    async with request_slots:
+        return await query.execute()
+
+
+async def aget_workspaces(supabase: AsyncClient) -> List[Dict[str, Any]]:
+    """
+    Fetch all workspaces from the database.
+    """
+    response = await aexecute(supabase.table("workspaces").select("*"))
+    return response.data or []
+
+
+async def aget_workspace_id(supabase: AsyncClient, name):
+    return (await aexecute(supabase.table("workspaces").select("*").eq("name", name))).data
+
+
+async def aget_brains_per_workspace(supabase: AsyncClient, workspace_id):
+    return (await aexecute(supabase.table("workspaces_brains").select("*").eq("workspace_id", workspace_id))).data
+
+
+async def aget_documents_per_brain(supabase: AsyncClient, brain_id):
+    return (await aexecute(supabase.table("knowledge").select("*").eq("brain_id", brain_id))).data
+
+
+async def aget_document_data(supabase: AsyncClient, document_id, batch_size=50, max_in_flight=4, joined=False):
+    """
+    Async version of `get_document_data`; the `IN` batches are fetched concurrently,
+    at most `max_in_flight` at a time, and put back in the document's 'order'.
+    """
+    if joined:
+        rows = (
+            await aexecute(
+                supabase.table("brains_vectors")
+                .select("vector_id, vectors(content)")
+                .eq("knowledge_id", document_id)
+                .order("order", desc=False)
+            )
+        ).data
+        return "\n".join([(row.get("vectors") or {}).get("content", "") for row in rows])
+
+    vector_ids = (
+        await aexecute(
+            supabase.table("brains_vectors")
+            .select("vector_id")
+            .eq("knowledge_id", document_id)
+            .order("order", desc=False)
+        )
+    ).data
+    ordered_ids = [vector_id['vector_id'] for vector_id in vector_ids]
+    in_flight = asyncio.Semaphore(max(max_in_flight, 1))
+
+    async def fetch(batch):
+        async with in_flight:
+            return (await aexecute(supabase.table("vectors").select("id, content").in_("id", batch))).data
+
+    results = await asyncio.gather(
+        *(fetch(ordered_ids[i:i + batch_size]) for i in range(0, len(ordered_ids), batch_size))
+    )
+    return "\n".join(order_contents(ordered_ids, results))
+
+
+async def aget_chunks_by_knowledge_ids(supabase: AsyncClient, knowledge_ids):
+    """
+    Async version of `get_chunks_by_knowledge_ids`.
+
+    Returns:
+        Dict[str, List[str]]: A dictionary where each key is a knowledge ID and the value is its ordered list of chunks.
+    """
+    knowledge_ids = normalize_knowledge_ids(knowledge_ids)
+    try:
+        response = await aexecute(
+            supabase.from_("brains_vectors")
+            .select("knowledge_id, vector_id, vectors(metadata, content)")
+            .in_("knowledge_id", knowledge_ids)
+            .order("knowledge_id", desc=False)
+            .order("order", desc=False)
+        )
+    except Exception as e:
+        print(f"Unexpected error during query execution: {e}")
+        return {}
+    return chunks_from_rows(response.data, knowledge_ids)
+
+
+async def aget_vectors_by_knowledge_ids(supabase: AsyncClient, knowledge_ids):
+    """
+    Async version of `get_vectors_by_knowledge_ids`.
+
+    Returns:
+        Dict[str, str]: A dictionary where each key is a knowledge ID and the value is its chunks joined by newlines.
+    """
+    chunks_dict = await aget_chunks_by_knowledge_ids(supabase, knowledge_ids)
+    return {key: "\n".join(value_list) for key, value_list in chunks_dict.items()}
+
+
+async def aiter_document_chunks(supabase: AsyncClient, knowledge_ids, page_size=500):
+    """
+    Async version of `iter_document_chunks`: yields (knowledge_id, chunk) pairs page by page.
+    """
+    knowledge_ids = normalize_knowledge_ids(knowledge_ids)
+    after = None
+    while True:
+        rows = (await aexecute(_chunk_page_query(supabase.from_("brains_vectors"), knowledge_ids, after, page_size))).data
+        for knowledge_id, chunk in _chunks_from_page(rows):
+            yield knowledge_id, chunk
+        if len(rows) < page_size:
+            return
+        after = (rows[-1]["knowledge_id"], rows[-1]["order"])
+
+
+async def aiter_documents(supabase: AsyncClient, knowledge_ids, page_size=500):
+    """
+    Async version of `iter_documents`: yields (knowledge_id, chunks) one document at a time.
+    """
+    current_id, chunks = None, []
+    async for knowledge_id, chunk in aiter_document_chunks(supabase, knowledge_ids, page_size):
+        if knowledge_id != current_id and chunks:
+            yield current_id, chunks
+            chunks = []
+        current_id = knowledge_id
+        chunks.append(chunk)
+    if chunks:
+        yield current_id, chunks
+
+
+async def aget_summary_by_knowledge_ids(supabase: AsyncClient, knowledge_ids):
+    """
+    Async version of `get_summary_by_knowledge_ids`.
+    """
+    knowledge_ids = normalize_knowledge_ids(knowledge_ids)
+    try:
+        response = await aexecute(
+            supabase.from_("knowledge")
+            .select("id, brain_id, file_name, url, summary, summary_embedding")
+            .in_("id", knowledge_ids)
+        )
+    except Exception as e:
+        print(f"Unexpected error during query execution: {e}")
+        return {}
+    return summaries_from_rows(response.data)
+
+
+async def afetch_versions(supabase: AsyncClient, cache: KnowledgeCache, knowledge_ids):
+    """
+    Async version of `fetch_versions`.
+    """
+    if not cache.version_column or not knowledge_ids:
+        return {}
+    try:
+        return _versions_from_rows(cache, (await aexecute(_version_query(supabase, cache, knowledge_ids))).data)
+    except Exception as e:
+        print(f"Unexpected error while reading knowledge versions: {e}")
+        return {}
+
+
+async def afetch_summary_rows(supabase: AsyncClient, cache: KnowledgeCache, knowledge_ids):
+    """
+    Async version of `fetch_summary_rows`.
+    """
+    if cache.version_column:
+        try:
+            response = await aexecute(_summary_query(supabase, knowledge_ids, cache.version_column))
+            return {row["id"]: row for row in response.data}
+        except Exception as e:
+            print(f"Unexpected error while reading knowledge versions: {e}")
+    try:
+        return {row["id"]: row for row in (await aexecute(_summary_query(supabase, knowledge_ids))).data}
+    except Exception as e:
+        print(f"Unexpected error during query execution: {e}")
+        return {}
+
+
+async def acached_chunks_by_knowledge_ids(supabase: AsyncClient, knowledge_ids, cache: Optional[KnowledgeCache] = None):
+    """
+    Async version of `cached_chunks_by_knowledge_ids`.
+    """
+    knowledge_ids = normalize_knowledge_ids(knowledge_ids)
+    cache = cache or get_knowledge_cache()
+    chunks, stale, missing = cache.lookup("chunks", knowledge_ids)
+    if stale:
+        valid, refetch = resolve_stale(cache, "chunks", stale, await afetch_versions(supabase, cache, list(stale)))
+        chunks.update(valid)
+        missing += refetch
+    if missing:
+        # Versions are read before the content so a concurrent update is caught on the next revalidation.
+        versions = await afetch_versions(supabase, cache, missing)
+        fetched = await aget_chunks_by_knowledge_ids(supabase, missing)
+        if fetched:
+            cache.store("chunks", fetched, versions)
+            chunks.update(fetched)
+    return {knowledge_id: chunks[knowledge_id] for knowledge_id in knowledge_ids if knowledge_id in chunks}
+
+
+async def acached_summary_by_knowledge_ids(supabase: AsyncClient, knowledge_ids, cache: Optional[KnowledgeCache] = None):
+    """
+    Async version of `cached_summary_by_knowledge_ids`.
+    """
+    knowledge_ids = normalize_knowledge_ids(knowledge_ids)
+    cache = cache or get_knowledge_cache()
+    rows, stale, missing = cache.lookup("summary", knowledge_ids)
+    if stale:
+        valid, refetch = resolve_stale(cache, "summary", stale, await afetch_versions(supabase, cache, list(stale)))
+        rows.update(valid)
+        missing += refetch
+    if missing:
+        fetched = await afetch_summary_rows(supabase, cache, missing)
+        if fetched:
+            cache.store("summary", fetched, summary_versions(cache, fetched))
+            rows.update(fetched)
+    return summaries_from_rows([rows[knowledge_id] for knowledge_id in knowledge_ids if knowledge_id in rows])
@@ -0,0 +1,244 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from ai_assistant.vector_store.sqlite_store import CacheStats, SQLiteLRUStore
+
+# Embedding layer in front of the vector store: query embeddings are served from a persistent
+# cache, and concurrent misses are coalesced into one batched request to the embedding model.
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", ".embedding_cache.sqlite")
+EMBEDDING_CACHE_MAX_ENTRIES = 200_000
+BATCH_WINDOW = 0.005
+MAX_BATCH_SIZE = 256
+
+
+@dataclass
+class EmbeddingStats(CacheStats):
+    """Counters of the embedding layer."""
+
+    requests: int = 0
+    embedded: int = 0
+
+
+class EmbeddingCache(SQLiteLRUStore):
+    """
+    A persistent LRU store of embeddings in a SQLite file, keyed by model and text hash.
+    Vectors are stored as raw float32 bytes.
+    """
+
+    table = "embeddings"
+    columns = "key TEXT PRIMARY KEY, vector BLOB NOT NULL, accessed_at REAL NOT NULL"
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        super().__init__(path)
+        self.max_entries = max_entries
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Returns the cached vectors of `keys` that are present.
+        """
+        now = time.time()
+        found = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit.
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                for key, blob in self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ):
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET accessed_at = ? WHERE key = ?", [(now, key) for key in found]
+                )
+        return found
+
+    def set_many(self, items: Dict[str, List[float]]) -> None:
+        """
+        Stores vectors by key, then evicts the least recently used entries above `max_entries`.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, accessed_at) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()],
+            )
+            self.evictions += self._evict_over_count(self.max_entries)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an `Embeddings` model with a persistent cache and request coalescing.
+
+    `embed_query` calls that miss the cache within `batch_window` seconds of each other are sent
+    as a single `embed_documents` request of at most `max_batch_size` texts; identical texts in a
+    batch are embedded once. `aembed_query` coalesces the misses of one event loop the same way,
+    without blocking it. `embed_documents` serves what it can from the cache and embeds the
+    rest in one request.
+
+    Batching queries through `embed_documents` is only right for symmetric models. For models
+    that embed queries differently (an `input_type`, or an instruction prefix on queries), pass
+    `symmetric=False`: query misses are still deduplicated per batch but embedded one by one with
+    `embed_query`. Query and document vectors are cached under separate keys either way.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache: Optional[EmbeddingCache] = None,
+        model_name: Optional[str] = None,
+        batch_window: float = BATCH_WINDOW,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        symmetric: bool = True,
+    ):
+        self.embeddings = embeddings
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self.model_name = model_name or getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.symmetric = symmetric
+        self.stats = EmbeddingStats()
+        self._pending: List[Tuple[str, Future, threading.Event]] = []
+        # Guards the pending queue and the stats counters.
+        self._pending_lock = threading.Lock()
+        self._flushing = False
+        self._async_pending: Dict[asyncio.AbstractEventLoop, List[Tuple[str, asyncio.Future]]] = {}
+        self._flush_tasks: Set[asyncio.Task] = set()
+
+    def _key(self, text: str, query: bool) -> str:
+        return EmbeddingCache.make_key(self.model_name, f"{'query' if query else 'document'}\0{text}")
+
+    def _record(self, hits: int = 0, misses: int = 0, requests: int = 0, embedded: int = 0) -> None:
+        with self._pending_lock:
+            self.stats.hits += hits
+            self.stats.misses += misses
+            self.stats.requests += requests
+            self.stats.embedded += embedded
+
+    def _store(self, texts: List[str], vectors: List[List[float]], query: bool, requests: int = 1) -> Dict[str, List[float]]:
+        self._record(requests=requests, embedded=len(texts))
+        embedded = dict(zip(texts, vectors))
+        self.cache.set_many({self._key(text, query): vector for text, vector in embedded.items()})
+        return embedded
+
+    def _embed_uncached(self, texts: List[str], query: bool = False) -> Dict[str, List[float]]:
+        unique = list(dict.fromkeys(texts))
+        if query and not self.symmetric:
+            return self._store(unique, [self.embeddings.embed_query(text) for text in unique], query, len(unique))
+        return self._store(unique, self.embeddings.embed_documents(unique), query)
+
+    async def _aembed_uncached(self, texts: List[str], query: bool = False) -> Dict[str, List[float]]:
+        unique = list(dict.fromkeys(texts))
+        if query and not self.symmetric:
+            vectors = await asyncio.gather(*(self.embeddings.aembed_query(text) for text in unique))
+            return self._store(unique, list(vectors), query, len(unique))
+        return self._store(unique, await self.embeddings.aembed_documents(unique), query)
+
+    def _lookup(self, texts: List[str], query: bool = False) -> Tuple[List[str], Dict[str, List[float]], List[str]]:
+        keys = [self._key(text, query) for text in texts]
+        cached = self.cache.get_many(keys)
+        missing = [text for text, key in zip(texts, keys) if key not in cached]
+        self._record(hits=len(texts) - len(missing), misses=len(missing))
+        return keys, cached, missing
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, cached, missing = self._lookup(texts)
+        embedded = self._embed_uncached(missing) if missing else {}
+        return [cached[key] if key in cached else embedded[text] for text, key in zip(texts, keys)]
+
+    def embed_query(self, text: str) -> List[float]:
+        _, cached, missing = self._lookup([text], query=True)
+        if not missing:
+            return next(iter(cached.values()))
+        future: Future = Future()
+        wake = threading.Event()
+        future.add_done_callback(lambda _: wake.set())
+        with self._pending_lock:
+            self._pending.append((text, future, wake))
+            # The first caller of a window flushes it; the others only wait for their result.
+            lead = not self._flushing
+            self._flushing = True
+        if lead:
+            self._flush(wait=True)
+        else:
+            wake.wait()
+            if not future.done():
+                # Promoted by the previous leader: flush the batch queued behind its own.
+                self._flush(wait=False)
+        return future.result()
+
+    def _flush(self, wait: bool) -> None:
+        if wait:
+            time.sleep(self.batch_window)
+        with self._pending_lock:
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            if self._pending:
+                # Hand the rest to the oldest waiter, so no caller flushes more than one batch.
+                self._pending[0][2].set()
+            else:
+                self._flushing = False
+        try:
+            embedded = self._embed_uncached([text for text, _, _ in batch], query=True)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+        else:
+            for text, future, _ in batch:
+                future.set_result(embedded[text])
+
+    async def aembed_query(self, text: str) -> List[float]:
+        _, cached, missing = self._lookup([text], query=True)
+        if not missing:
+            return next(iter(cached.values()))
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._async_pending.get(loop)
+        if pending is None:
+            # The first miss of a window schedules its flush; the flush runs as its own task so that
+            # cancelling any caller, the first one included, leaves the others waiting on a live batch.
+            pending = self._async_pending[loop] = []
+            task = loop.create_task(self._aflush(loop))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+        pending.append((text, future))
+        return await future
+
+    async def _aflush(self, loop: asyncio.AbstractEventLoop) -> None:
+        await asyncio.sleep(self.batch_window)
+        pending = self._async_pending.pop(loop)
+        await asyncio.gather(*(
+            self._aflush_batch(pending[i:i + self.max_batch_size])
+            for i in range(0, len(pending), self.max_batch_size)
+        ))
+
+    async def _aflush_batch(self, batch: List[Tuple[str, Any]]) -> None:
+        try:
+            embedded = await self._aembed_uncached([text for text, _ in batch], query=True)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(embedded[text])
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, cached, missing = self._lookup(texts)
+        embedded = await self._aembed_uncached(missing) if missing else {}
+        return [cached[key] if key in cached else embedded[text] for text, key in zip(texts, keys)]
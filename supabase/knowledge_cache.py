@@ -0,0 +1,283 @@
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from ai_assistant.vector_store.sqlite_store import CacheStats, SQLiteLRUStore
+from ai_assistant.vector_store.supabase_db import (
+    get_chunks_by_knowledge_ids,
+    normalize_knowledge_ids,
+    summaries_from_rows,
+)
+
+# Local read-through cache for knowledge content. Chunk text and summary rows are kept in a
+# SQLite file keyed by knowledge ID, so enriching the same brain again reads nothing from Supabase.
+KNOWLEDGE_CACHE_PATH = os.environ.get("KNOWLEDGE_CACHE_PATH", ".knowledge_cache.sqlite")
+KNOWLEDGE_CACHE_TTL = 24 * 3600
+KNOWLEDGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# A `knowledge` column that changes on every update, such as "updated_at". When set, stale entries
+# are revalidated against it instead of being fetched again.
+VERSION_COLUMN: Optional[str] = None
+
+SUMMARY_COLUMNS = "id, brain_id, file_name, url, summary, summary_embedding"
+
+
+@dataclass
+class KnowledgeCacheStats(CacheStats):
+    """Hit/miss counters of the knowledge cache."""
+
+    revalidations: int = 0
+    evictions: int = 0
+
+
+class KnowledgeCache(SQLiteLRUStore):
+    """
+    A size-bounded LRU store of knowledge content in a SQLite file.
+
+    Entries younger than `ttl` seconds are served as they are. Older entries are stale:
+    with a `version_column`, they are served again only if the `knowledge` row still holds
+    the version they were stored with; otherwise, or without one, they are fetched again.
+    """
+
+    table = "knowledge"
+    columns = (
+        "kind TEXT NOT NULL, knowledge_id TEXT NOT NULL, version TEXT, value TEXT NOT NULL, "
+        "size INTEGER NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+        "PRIMARY KEY (kind, knowledge_id)"
+    )
+
+    def __init__(
+        self,
+        path: str = KNOWLEDGE_CACHE_PATH,
+        ttl: Optional[float] = KNOWLEDGE_CACHE_TTL,
+        max_bytes: int = KNOWLEDGE_CACHE_MAX_BYTES,
+        version_column: Optional[str] = VERSION_COLUMN,
+    ):
+        super().__init__(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.version_column = version_column
+        self.stats = KnowledgeCacheStats()
+
+    def lookup(self, kind: str, knowledge_ids: List[str]) -> Tuple[Dict[str, Any], Dict[str, Tuple[Any, Optional[str]]], List[str]]:
+        """
+        Look up `knowledge_ids` for one kind of content ("chunks" or "summary").
+
+        Returns:
+            The fresh values by knowledge ID, the stale (value, version) pairs by knowledge ID,
+            and the knowledge IDs that are not cached at all.
+        """
+        now = time.time()
+        fresh, stale, missing = {}, {}, []
+        with self._lock:
+            rows = {}
+            # Stay under SQLite's bound-parameter limit.
+            for i in range(0, len(knowledge_ids), 500):
+                batch = knowledge_ids[i:i + 500]
+                rows.update({
+                    row[0]: row[1:]
+                    for row in self._conn.execute(
+                        "SELECT knowledge_id, value, version, created_at FROM knowledge "
+                        f"WHERE kind = ? AND knowledge_id IN ({','.join('?' * len(batch))})",
+                        (kind, *batch),
+                    )
+                })
+            for knowledge_id in knowledge_ids:
+                row = rows.get(knowledge_id)
+                if row is None:
+                    missing.append(knowledge_id)
+                elif self.ttl is not None and now - row[2] > self.ttl:
+                    stale[knowledge_id] = (json.loads(row[0]), row[1])
+                else:
+                    fresh[knowledge_id] = json.loads(row[0])
+            if fresh:
+                self._conn.executemany(
+                    "UPDATE knowledge SET accessed_at = ? WHERE kind = ? AND knowledge_id = ?",
+                    [(now, kind, knowledge_id) for knowledge_id in fresh],
+                )
+            self.stats.hits += len(fresh)
+            self.stats.misses += len(missing)
+        return fresh, stale, missing
+
+    def store(self, kind: str, values: Dict[str, Any], versions: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Store values by knowledge ID with the version they were read at, then evict the
+        least recently used entries until the cache fits in `max_bytes`.
+        """
+        now = time.time()
+        versions = versions or {}
+        entries = []
+        for knowledge_id, value in values.items():
+            data = json.dumps(value)
+            version = versions.get(knowledge_id)
+            entries.append((kind, knowledge_id, None if version is None else str(version), data, len(data), now, now))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO knowledge "
+                "(kind, knowledge_id, version, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                entries,
+            )
+            self.stats.evictions += self._evict_over_size(self.max_bytes)
+
+    def touch(self, kind: str, knowledge_ids: List[str]) -> None:
+        """
+        Mark stale entries whose version did not change as fresh again.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE knowledge SET created_at = ?, accessed_at = ? WHERE kind = ? AND knowledge_id = ?",
+                [(now, now, kind, knowledge_id) for knowledge_id in knowledge_ids],
+            )
+
+    def invalidate(self, knowledge_ids=None) -> None:
+        """
+        Drop the given knowledge IDs, or everything when none are given.
+        """
+        if knowledge_ids is None:
+            self.clear()
+            return
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM knowledge WHERE knowledge_id = ?",
+                [(knowledge_id,) for knowledge_id in normalize_knowledge_ids(knowledge_ids)],
+            )
+
+    def size(self) -> int:
+        """
+        Returns the total size in bytes of the cached values.
+        """
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM knowledge").fetchone()[0]
+
+
+_cache: Optional[KnowledgeCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_knowledge_cache() -> KnowledgeCache:
+    """
+    Returns the process-wide knowledge cache, creating it on first use.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = KnowledgeCache()
+        return _cache
+
+
+def resolve_stale(cache: KnowledgeCache, kind, stale, current_versions):
+    """
+    Splits stale entries into those still valid, which are refreshed and returned by knowledge ID,
+    and those to fetch again.
+    """
+    valid, refetch = {}, []
+    for knowledge_id, (value, version) in stale.items():
+        current = current_versions.get(knowledge_id)
+        if version is not None and current is not None and str(current) == version:
+            valid[knowledge_id] = value
+        else:
+            refetch.append(knowledge_id)
+    if valid:
+        cache.touch(kind, list(valid))
+    cache.stats.revalidations += len(stale)
+    cache.stats.hits += len(valid)
+    cache.stats.misses += len(refetch)
+    return valid, refetch
+
+
+def _version_query(supabase, cache, knowledge_ids):
+    return supabase.from_("knowledge").select(f"id, {cache.version_column}").in_("id", knowledge_ids)
+
+
+def _versions_from_rows(cache, rows):
+    return {row["id"]: row.get(cache.version_column) for row in rows}
+
+
+def summary_versions(cache, rows_by_id):
+    if not cache.version_column:
+        return None
+    return {knowledge_id: row.get(cache.version_column) for knowledge_id, row in rows_by_id.items()}
+
+
+def _summary_query(supabase, knowledge_ids, version_column=None):
+    columns = f"{SUMMARY_COLUMNS}, {version_column}" if version_column else SUMMARY_COLUMNS
+    return supabase.from_("knowledge").select(columns).in_("id", knowledge_ids)
+
+
+def fetch_summary_rows(supabase, cache, knowledge_ids):
+    """
+    Reads the `knowledge` rows of the summaries by ID, with the version column when the cache has one.
+    If the versioned select fails, for instance because the column does not exist, the rows are read
+    again without it: revalidation is lost but the summaries are not.
+    """
+    if cache.version_column:
+        try:
+            return {row["id"]: row for row in _summary_query(supabase, knowledge_ids, cache.version_column).execute().data}
+        except Exception as e:
+            print(f"Unexpected error while reading knowledge versions: {e}")
+    try:
+        return {row["id"]: row for row in _summary_query(supabase, knowledge_ids).execute().data}
+    except Exception as e:
+        print(f"Unexpected error during query execution: {e}")
+        return {}
+
+
+def fetch_versions(supabase, cache, knowledge_ids):
+    """
+    Reads the current version of `knowledge` rows; one small query without any content.
+    """
+    if not cache.version_column or not knowledge_ids:
+        return {}
+    try:
+        return _versions_from_rows(cache, _version_query(supabase, cache, knowledge_ids).execute().data)
+    except Exception as e:
+        print(f"Unexpected error while reading knowledge versions: {e}")
+        return {}
+
+
+def cached_chunks_by_knowledge_ids(supabase, knowledge_ids, cache: Optional[KnowledgeCache] = None):
+    """
+    Read-through version of `get_chunks_by_knowledge_ids`.
+
+    Returns:
+        Dict[str, List[str]]: A dictionary where each key is a knowledge ID and the value is its ordered list of chunks.
+    """
+    knowledge_ids = normalize_knowledge_ids(knowledge_ids)
+    cache = cache or get_knowledge_cache()
+    chunks, stale, missing = cache.lookup("chunks", knowledge_ids)
+    if stale:
+        valid, refetch = resolve_stale(cache, "chunks", stale, fetch_versions(supabase, cache, list(stale)))
+        chunks.update(valid)
+        missing += refetch
+    if missing:
+        # Versions are read before the content so a concurrent update is caught on the next revalidation.
+        versions = fetch_versions(supabase, cache, missing)
+        fetched = get_chunks_by_knowledge_ids(supabase, missing)
+        if fetched:
+            cache.store("chunks", fetched, versions)
+            chunks.update(fetched)
+    return {knowledge_id: chunks[knowledge_id] for knowledge_id in knowledge_ids if knowledge_id in chunks}
+
+
+def cached_summary_by_knowledge_ids(supabase, knowledge_ids, cache: Optional[KnowledgeCache] = None):
+    """
+    Read-through version of `get_summary_by_knowledge_ids`.
+    The raw `knowledge` rows are cached and decoded on every read.
+    """
+    knowledge_ids = normalize_knowledge_ids(knowledge_ids)
+    cache = cache or get_knowledge_cache()
+    rows, stale, missing = cache.lookup("summary", knowledge_ids)
+    if stale:
+        valid, refetch = resolve_stale(cache, "summary", stale, fetch_versions(supabase, cache, list(stale)))
+        rows.update(valid)
+        missing += refetch
+    if missing:
+        fetched = fetch_summary_rows(supabase, cache, missing)
+        if fetched:
+            cache.store("summary", fetched, summary_versions(cache, fetched))
+            rows.update(fetched)
+    return summaries_from_rows([rows[knowledge_id] for knowledge_id in knowledge_ids if knowledge_id in rows])
@@ -0,0 +1,269 @@
+import json
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from ai_assistant.vector_store.summary_index import SummaryIndex
+from ai_assistant.vector_store.supabase_db import (
+    LOCAL_VECTOR_STORE_PATH,
+    VectorBackend,
+    _chunk_page_query,
+    decode_string,
+    decode_vector,
+    deduplicate_hits,
+    normalize_knowledge_ids,
+    parse_search_filter,
+    tokenize,
+)
+
+# Embedded vector store for single-tenant deployments, local benchmarks and tests. Chunks live in a
+# SQLite file with an FTS5 index for lexical search; their embeddings are held in memory as one
+# normalized float32 matrix, so a filtered top-k search is a single matrix product with no network.
+
+SYNC_COLUMNS = "knowledge_id, brain_id, order, vector_id, vectors(id, content, metadata, embedding)"
+
+
+class LocalVectorStore(VectorBackend):
+    """
+    A `VectorBackend` stored in a local SQLite file.
+
+    Fill it with `add_chunks` or copy knowledge from Supabase with `sync_from_supabase`. Searches use the
+    same `knowledge_ids`/`p_brain_id` filter semantics and return the same documents as
+    `CustomSupabaseVectorStore`.
+    """
+
+    def __init__(self, path: str = LOCAL_VECTOR_STORE_PATH, embedding: Optional[Embeddings] = None):
+        self.path = path
+        self._embedding = embedding
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id TEXT UNIQUE NOT NULL, knowledge_id TEXT, brain_id TEXT, position INTEGER, "
+            "content TEXT NOT NULL, metadata TEXT, embedding BLOB NOT NULL)"
+        )
+        self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(content)")
+        self._index = self._load_index()
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding
+
+    def __len__(self):
+        return len(self._index)
+
+    def _load_index(self) -> SummaryIndex:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rowid, id, knowledge_id, brain_id, embedding FROM chunks ORDER BY rowid"
+            ).fetchall()
+        return SummaryIndex([
+            {
+                "rowid": rowid,
+                "id": vector_id,
+                "knowledge_id": knowledge_id,
+                "brain_id": brain_id,
+                "embedding": np.frombuffer(embedding, dtype=np.float32),
+            }
+            for rowid, vector_id, knowledge_id, brain_id, embedding in rows
+        ])
+
+    def add_chunks(self, chunks: List[Dict[str, Any]], reload: bool = True) -> None:
+        """
+        Inserts or replaces chunks, given as dicts with `id`, `knowledge_id`, `brain_id`, `position`,
+        `content`, `metadata` and `embedding` (a sequence of floats or a pgvector value).
+        Pass `reload=False` when adding many batches and call `reload_index` once at the end.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for chunk in chunks:
+                    existing = self._conn.execute("SELECT rowid FROM chunks WHERE id = ?", (chunk["id"],)).fetchone()
+                    if existing is not None:
+                        self._conn.execute("DELETE FROM chunks WHERE rowid = ?", existing)
+                        self._conn.execute("DELETE FROM chunks_fts WHERE rowid = ?", existing)
+                    cursor = self._conn.execute(
+                        "INSERT INTO chunks (id, knowledge_id, brain_id, position, content, metadata, embedding) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            chunk["id"],
+                            chunk.get("knowledge_id"),
+                            chunk.get("brain_id"),
+                            chunk.get("position"),
+                            chunk["content"],
+                            json.dumps(chunk.get("metadata") or {}),
+                            decode_vector(chunk["embedding"]).tobytes(),
+                        ),
+                    )
+                    self._conn.execute(
+                        "INSERT INTO chunks_fts (rowid, content) VALUES (?, ?)", (cursor.lastrowid, chunk["content"])
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if reload:
+            self.reload_index()
+
+    def reload_index(self) -> None:
+        """
+        Rebuilds the in-memory embedding matrix from the SQLite file.
+        """
+        self._index = self._load_index()
+
+    def delete_knowledge(self, knowledge_ids, reload: bool = True) -> None:
+        """
+        Removes every chunk of the given knowledge IDs.
+        """
+        knowledge_ids = normalize_knowledge_ids(knowledge_ids)
+        with self._lock:
+            for knowledge_id in knowledge_ids:
+                self._conn.execute(
+                    "DELETE FROM chunks_fts WHERE rowid IN (SELECT rowid FROM chunks WHERE knowledge_id = ?)",
+                    (knowledge_id,),
+                )
+                self._conn.execute("DELETE FROM chunks WHERE knowledge_id = ?", (knowledge_id,))
+        if reload:
+            self.reload_index()
+
+    def sync_from_supabase(self, supabase, knowledge_ids, page_size=500) -> int:
+        """
+        Copies the chunks and embeddings of the given knowledge IDs from Supabase, page by page.
+
+        Returns:
+            int: The number of chunks copied.
+        """
+        knowledge_ids = normalize_knowledge_ids(knowledge_ids)
+        self.delete_knowledge(knowledge_ids, reload=False)
+        copied = 0
+        after = None
+        while True:
+            rows = _chunk_page_query(
+                supabase.from_("brains_vectors"), knowledge_ids, after, page_size, SYNC_COLUMNS
+            ).execute().data
+            chunks = []
+            for row in rows:
+                vector = row.get("vectors") or {}
+                if vector.get("content") and vector.get("embedding") is not None:
+                    chunks.append({
+                        "id": row["vector_id"],
+                        "knowledge_id": row["knowledge_id"],
+                        "brain_id": row.get("brain_id"),
+                        "position": row.get("order"),
+                        "content": decode_string(vector["content"]),
+                        "metadata": vector.get("metadata") or {},
+                        "embedding": vector["embedding"],
+                    })
+                else:
+                    print(f"Incomplete data for vector_id: {row.get('vector_id')}, knowledge_id: {row.get('knowledge_id')}")
+            self.add_chunks(chunks, reload=False)
+            copied += len(chunks)
+            if len(rows) < page_size:
+                self.reload_index()
+                return copied
+            after = (rows[-1]["knowledge_id"], rows[-1]["order"])
+
+    def _documents(self, hits: List[Tuple[Dict[str, Any], float]]) -> List[Tuple[Document, float]]:
+        if not hits:
+            return []
+        rowids = [record["rowid"] for record, _ in hits]
+        with self._lock:
+            rows = {
+                rowid: (content, metadata)
+                for rowid, content, metadata in self._conn.execute(
+                    f"SELECT rowid, content, metadata FROM chunks WHERE rowid IN ({','.join('?' * len(rowids))})",
+                    rowids,
+                )
+            }
+        return [
+            (
+                self._to_document({
+                    "id": record["id"],
+                    "knowledge_id": record["knowledge_id"],
+                    "similarity": score,
+                    "content": rows[record["rowid"]][0],
+                    "metadata": json.loads(rows[record["rowid"]][1] or "{}"),
+                }),
+                score,
+            )
+            for record, score in hits
+            if record["rowid"] in rows
+        ]
+
+    def similarity_search_by_vector_with_relevance_scores(
+            self,
+            query: List[float],
+            k: int=1000,
+            filter: Optional[Dict[str, Any]] = None,
+            postgrest_filter: Optional[str] = None,
+            score_threshold: Optional[float] = None,
+    ) -> List[Tuple[Document, float]]:
+        if postgrest_filter:
+            raise ValueError("postgrest_filter is only supported by the Supabase backend")
+        hits = self._index.search(query, k=k, filter=filter, score_threshold=score_threshold)
+        return self._apply_threshold(self._documents(hits), score_threshold)
+
+    def similarity_search_by_vectors_with_relevance_scores(
+            self,
+            queries: List[List[float]],
+            k: int=1000,
+            filter: Optional[Dict[str, Any]] = None,
+            postgrest_filter: Optional[str] = None,
+            score_threshold: Optional[float] = None,
+            deduplicate: bool = True,
+            **kwargs: Any,
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Ranks the chunks for all query vectors with one matrix product.
+        """
+        if postgrest_filter:
+            raise ValueError("postgrest_filter is only supported by the Supabase backend")
+        if not len(queries):
+            return []
+        batches = self._index.search_batch(queries, k=k, filter=filter, score_threshold=score_threshold)
+        results = [self._documents(hits) for hits in batches]
+        return deduplicate_hits(results) if deduplicate else results
+
+    def lexical_search(
+            self,
+            query_text: str,
+            k: int = 50,
+            filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Document]:
+        """
+        Full-text search with the FTS5 index, ranked by its built-in BM25.
+        """
+        terms = list(dict.fromkeys(term for term in tokenize(query_text) if len(term) > 2))
+        if not terms:
+            return []
+        knowledge_ids, brain_id, _ = parse_search_filter(filter) if filter is not None else (None, None, None)
+        # Quote every term so punctuation inside identifiers is not read as FTS5 syntax.
+        sql = (
+            "SELECT chunks.id, chunks.knowledge_id, chunks.content, chunks.metadata "
+            "FROM chunks_fts JOIN chunks ON chunks.rowid = chunks_fts.rowid WHERE chunks_fts MATCH ?"
+        )
+        params: List[Any] = [" OR ".join('"' + term.replace('"', '""') + '"' for term in terms)]
+        if knowledge_ids:
+            sql += f" AND chunks.knowledge_id IN ({','.join('?' * len(knowledge_ids))})"
+            params.extend(knowledge_ids)
+        if brain_id:
+            sql += " AND chunks.brain_id = ?"
+            params.append(brain_id)
+        sql += " ORDER BY bm25(chunks_fts) LIMIT ?"
+        params.append(k)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            self._to_document({
+                "id": vector_id,
+                "knowledge_id": knowledge_id,
+                "content": content,
+                "metadata": json.loads(metadata or "{}"),
+            })
+            for vector_id, knowledge_id, content, metadata in rows
+        ]
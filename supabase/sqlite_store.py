@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+
+# Plumbing shared by the local SQLite caches in front of Supabase (embeddings, knowledge content):
+# one WAL-mode connection guarded by a lock, an `accessed_at` index that gives the LRU order, and
+# eviction of the least recently used rows by count or by total size.
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters of a cache."""
+
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class SQLiteLRUStore:
+    """
+    Base class of an LRU table in a SQLite file.
+
+    Subclasses set `table` and `columns`, the column definitions of the table including its primary
+    key and a REAL `accessed_at` column; they read and write under `self._lock` and call one of the
+    `_evict_*` methods after writing.
+    """
+
+    table: str
+    columns: str
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} ({self.columns})")
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.table}_accessed_at ON {self.table} (accessed_at)"
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def _evict_over_count(self, max_entries: int) -> int:
+        """
+        Deletes the least recently used rows above `max_entries`; the caller holds the lock.
+        Returns the number of rows deleted.
+        """
+        (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        if count <= max_entries:
+            return 0
+        overflow = count - max_entries
+        self._conn.execute(
+            f"DELETE FROM {self.table} WHERE rowid IN ("
+            f"SELECT rowid FROM {self.table} ORDER BY accessed_at ASC LIMIT ?)",
+            (overflow,),
+        )
+        return overflow
+
+    def _evict_over_size(self, max_bytes: int, size_column: str = "size") -> int:
+        """
+        Deletes the least recently used rows until the sum of `size_column` fits in `max_bytes`;
+        the caller holds the lock. Returns the number of rows deleted.
+        """
+        total = self._conn.execute(f"SELECT COALESCE(SUM({size_column}), 0) FROM {self.table}").fetchone()[0]
+        if total <= max_bytes:
+            return 0
+        doomed = []
+        for rowid, size in self._conn.execute(
+            f"SELECT rowid, {size_column} FROM {self.table} ORDER BY accessed_at ASC"
+        ):
+            if total <= max_bytes:
+                break
+            doomed.append((rowid,))
+            total -= size
+        self._conn.executemany(f"DELETE FROM {self.table} WHERE rowid = ?", doomed)
+        return len(doomed)
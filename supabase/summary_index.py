@@ -0,0 +1,144 @@
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ai_assistant.vector_store.supabase_db import (
+    get_summary_by_knowledge_ids,
+    parse_search_filter,
+    summary_matrix,
+)
+
+# Local first stage for knowledge-level retrieval: the summary embeddings of a set of knowledge
+# items are kept as one normalized float32 matrix and ranked with a single matrix product, instead
+# of one `match_documents` round trip per question.
+
+
+def normalize_rows(matrix):
+    """
+    Scales every row to unit length so that dot products are cosine similarities.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class SummaryIndex:
+    """
+    An in-memory cosine-similarity index over knowledge summary embeddings.
+
+    Build it from the output of `get_summary_by_knowledge_ids`; records without an embedding are
+    left out. `save` writes the matrix to a `.npy` file that `load` can memory-map, so several
+    processes share one copy of a large index.
+    """
+
+    def __init__(self, summaries: Sequence[Dict[str, Any]], matrix=None):
+        self.records = [
+            {key: value for key, value in summary.items() if key != "embedding"}
+            for summary in summaries
+            if matrix is not None or summary.get("embedding") is not None
+        ]
+        if matrix is None:
+            # The decoded matrix is normalized into the index's own copy; it is not stacked again.
+            matrix = summary_matrix(summaries)
+            if matrix.size:
+                matrix = normalize_rows(matrix)
+        self.matrix = matrix
+        self.knowledge_ids = np.array([record.get("knowledge_id") for record in self.records], dtype=object)
+        self.brain_ids = np.array([record.get("brain_id") for record in self.records], dtype=object)
+
+    def __len__(self):
+        return len(self.records)
+
+    @classmethod
+    def from_knowledge_ids(cls, supabase, knowledge_ids):
+        """
+        Builds the index from the summaries of the given knowledge IDs.
+        """
+        return cls(get_summary_by_knowledge_ids(supabase, knowledge_ids))
+
+    def save(self, path):
+        """
+        Writes the index to `{path}.npy` (the matrix) and `{path}.json` (the records).
+        """
+        np.save(f"{path}.npy", np.ascontiguousarray(self.matrix))
+        with open(f"{path}.json", "w") as f:
+            json.dump(self.records, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Loads an index written by `save`; with `mmap` the matrix stays on disk and is paged in on demand.
+        """
+        with open(f"{path}.json") as f:
+            records = json.load(f)
+        return cls(records, matrix=np.load(f"{path}.npy", mmap_mode="r" if mmap else None))
+
+    def mask(self, filter=None):
+        """
+        Returns the rows allowed by a search filter, with the same semantics as `CustomSupabaseVectorStore`:
+        a non-empty `knowledge_ids` list and a `p_brain_id` other than "" or "none" each restrict the results.
+        Returns None when nothing is filtered.
+        """
+        if filter is None:
+            return None
+        knowledge_ids, brain_id, _ = parse_search_filter(filter)
+        if knowledge_ids is None and brain_id is None:
+            return None
+        allowed = np.ones(len(self.records), dtype=bool)
+        if knowledge_ids is not None:
+            allowed &= np.isin(self.knowledge_ids, list(knowledge_ids))
+        if brain_id is not None:
+            allowed &= self.brain_ids == brain_id
+        return allowed
+
+    def search_batch(
+        self,
+        queries,
+        k: int = 10,
+        filter: Optional[Any] = None,
+        score_threshold: Optional[float] = None,
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """
+        Ranks the knowledge items for several query embeddings with one matrix product.
+
+        Returns:
+            For each query, up to `k` (record, similarity) pairs, best first.
+        """
+        queries = normalize_rows(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        rows = np.arange(len(self.records))
+        allowed = self.mask(filter)
+        if allowed is not None:
+            rows = rows[allowed]
+        if not len(rows) or k <= 0:
+            return [[] for _ in queries]
+        candidates = self.matrix if allowed is None else self.matrix[rows]
+        scores = queries @ candidates.T
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for query_scores, query_top in zip(scores, top):
+            ranked = query_top[np.argsort(-query_scores[query_top])]
+            results.append([
+                (self.records[rows[i]], float(query_scores[i]))
+                for i in ranked
+                if score_threshold is None or query_scores[i] >= score_threshold
+            ])
+        return results
+
+    def search(self, query, k: int = 10, filter: Optional[Any] = None, score_threshold: Optional[float] = None):
+        """
+        Ranks the knowledge items for one query embedding.
+
+        Returns:
+            List[Tuple[dict, float]]: Up to `k` (record, similarity) pairs, best first.
+        """
+        return self.search_batch([query], k=k, filter=filter, score_threshold=score_threshold)[0]
+
+    def top_knowledge_ids(self, query, k: int = 10, filter: Optional[Any] = None, score_threshold: Optional[float] = None):
+        """
+        Returns the knowledge IDs of the best `k` items; pass them as the `knowledge_ids` filter of the
+        vector store to search chunks only within the most relevant knowledge.
+        """
+        return [record["knowledge_id"] for record, _ in self.search(query, k, filter, score_threshold)]
@@ -0,0 +1,120 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+# The vector store modules in supabase/ import each other as ai_assistant.vector_store.<module>;
+# map that package onto the directory (a plain path entry would shadow the supabase client package).
+_vector_store = types.ModuleType("ai_assistant.vector_store")
+_vector_store.__path__ = [os.path.join(os.path.dirname(__file__), "..", "supabase")]
+sys.modules.setdefault("ai_assistant", types.ModuleType("ai_assistant"))
+sys.modules.setdefault("ai_assistant.vector_store", _vector_store)
+
+from ai_assistant.vector_store.cached_embeddings import CachedEmbeddings, EmbeddingCache  # noqa: E402
+
+
+class CountingEmbeddings(Embeddings):
+    """Embeds a text as [len(text), kind]; kind is 1.0 for documents and 2.0 for queries."""
+
+    model = "counting"
+
+    def __init__(self, latency=0.02):
+        self.latency = latency
+        self.document_calls = []
+        self.query_calls = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.document_calls.append(list(texts))
+        time.sleep(self.latency)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        with self._lock:
+            self.query_calls.append(text)
+        time.sleep(self.latency)
+        return [float(len(text)), 2.0]
+
+    async def aembed_documents(self, texts):
+        self.document_calls.append(list(texts))
+        await asyncio.sleep(self.latency)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    async def aembed_query(self, text):
+        self.query_calls.append(text)
+        await asyncio.sleep(self.latency)
+        return [float(len(text)), 2.0]
+
+
+def _embeddings(tmp_path, model=None, **kwargs):
+    model = model or CountingEmbeddings()
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"))
+    return model, CachedEmbeddings(model, cache, batch_window=0.02, **kwargs)
+
+
+def test_threaded_queries_are_coalesced_into_bounded_batches(tmp_path):
+    model, embeddings = _embeddings(tmp_path, max_batch_size=16)
+    texts = [f"query {i % 40}" for i in range(200)]
+    with ThreadPoolExecutor(64) as executor:
+        vectors = list(executor.map(embeddings.embed_query, texts))
+
+    assert vectors == [[float(len(text)), 1.0] for text in texts]
+    # Texts are deduplicated within a batch, and the 200 queries need only a few requests.
+    assert {text for call in model.document_calls for text in call} == set(texts)
+    assert all(len(set(call)) == len(call) for call in model.document_calls)
+    assert all(len(call) <= 16 for call in model.document_calls)
+    assert len(model.document_calls) <= 20
+    assert embeddings.stats.requests == len(model.document_calls)
+    assert embeddings.stats.hits + embeddings.stats.misses == len(texts)
+    assert not embeddings._pending and not embeddings._flushing
+
+    # A second round is served from the cache.
+    requests = embeddings.stats.requests
+    assert embeddings.embed_query("query 3") == [7.0, 1.0]
+    assert embeddings.stats.requests == requests
+
+
+def test_async_queries_are_coalesced_per_event_loop(tmp_path):
+    model, embeddings = _embeddings(tmp_path, max_batch_size=16)
+
+    async def run(prefix):
+        return await asyncio.gather(*(embeddings.aembed_query(f"{prefix}{i}") for i in range(40)))
+
+    for prefix in ("a", "b"):  # a second event loop must work as well
+        vectors = asyncio.run(run(prefix))
+        assert vectors == [[float(len(f"{prefix}{i}")), 1.0] for i in range(40)]
+    assert [len(call) for call in model.document_calls] == [16, 16, 8, 16, 16, 8]
+    assert embeddings.stats.requests == 6
+    assert not embeddings._async_pending
+
+
+def test_cancelled_async_query_does_not_strand_the_batch(tmp_path):
+    _, embeddings = _embeddings(tmp_path)
+
+    async def run():
+        first = asyncio.ensure_future(embeddings.aembed_query("first"))
+        second = asyncio.ensure_future(embeddings.aembed_query("second"))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await asyncio.wait_for(second, 1)
+
+    assert asyncio.run(run()) == [6.0, 1.0]
+
+
+def test_asymmetric_models_embed_queries_with_embed_query(tmp_path):
+    model, embeddings = _embeddings(tmp_path, symmetric=False)
+    with ThreadPoolExecutor(8) as executor:
+        vectors = list(executor.map(embeddings.embed_query, ["x", "yy", "x"]))
+    assert vectors == [[1.0, 2.0], [2.0, 2.0], [1.0, 2.0]]
+    assert sorted(model.query_calls) == ["x", "yy"]
+    assert asyncio.run(embeddings.aembed_query("zzz")) == [3.0, 2.0]
+
+    # Documents with the same text are cached separately from queries.
+    assert embeddings.embed_documents(["x"]) == [[1.0, 1.0]]
+    assert embeddings.embed_query("x") == [1.0, 2.0]